@@ -1,20 +1,62 @@
-from fastapi import FastAPI, File, UploadFile
-import pandas as pd
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
 
-from application.utils.parser import parse_file
-from application.routers import parser
+from fastapi import FastAPI
+
+from application.routers import flights, metrics, parser
+from application.utils.db import create_db_engine, drop_stale_loads, init_schema
+from application.utils.jobs import JobManager, JobStore
+from configuration.config import Config
+
+
+logger = logging.getLogger(__name__)
 
 
 def _init_routers(app: FastAPI):
     app.include_router(parser.router)
-    
+    app.include_router(flights.router)
+    app.include_router(metrics.router)
+
 
-def create_app():
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    config = app.state.config
+    engine = create_db_engine(config.db)
+    if app.state.init_db:
+        init_schema(engine, config.db.partitioned)
+        drop_stale_loads(engine, config.ingest.stage_retain_hours)
+    app.state.engine = engine
+    ingest = config.ingest
+    # Workers share job status through the database so any of them can report on any job.
+    store = JobStore(engine, ingest.jobs_retain) if config.app.workers > 1 else None
+    app.state.jobs = JobManager(ingest.workers, ingest.queue_limit, ingest.jobs_retain,
+                                store, ingest.progress_interval, ingest.parse_processes)
+    logger.info(json.dumps({
+        "event": "startup",
+        "pid": os.getpid(),
+        "startup_seconds": round(time.monotonic() - app.state.started_at, 3),
+    }))
+    yield
+    app.state.jobs.shutdown()
+    engine.dispose()
+
+
+def create_app(config: Config, init_db: bool = True, started_at: Optional[float] = None):
+    """`started_at` is the `time.monotonic()` the startup time is logged from,
+    by default now. Pass `init_db=False` when the schema was set up already."""
     app = FastAPI(
         title='Parser Service',
-        docs_url='/api/swagger'
+        docs_url='/api/swagger',
+        lifespan=_lifespan,
     )
-    
+    app.state.config = config
+    app.state.init_db = init_db
+    app.state.started_at = time.monotonic() if started_at is None else started_at
+
     _init_routers(app)
 
-    return app
\ No newline at end of file
+    return app
@@ -0,0 +1,105 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+
+from application.utils.flights import (
+    AREA_MATCHES, ROLLUP_GROUPS, Cursor, FlightFilter, InvalidCursor, get_flight, query_daily, query_flights,
+)
+from application.utils.geo import Area, InvalidArea
+
+
+router = APIRouter(prefix='/flights', tags=['Flights'])
+
+@router.get('')
+def list_flights(
+    request: Request,
+    region: Optional[str] = None,
+    dof_from: Optional[date] = None,
+    dof_to: Optional[date] = None,
+    dep: Optional[str] = None,
+    dest: Optional[str] = None,
+    typ: Optional[str] = None,
+    reg: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+):
+    try:
+        after = Cursor.decode(cursor) if cursor else None
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filters = FlightFilter(region=region, dep=dep, dest=dest, typ=typ, reg=reg,
+                           dof_from=dof_from, dof_to=dof_to)
+    items, next_cursor = query_flights(request.app.state.engine, filters, limit, after)
+    return {
+        "items": items,
+        "next_cursor": next_cursor.encode() if next_cursor else None,
+    }
+
+@router.get('/area')
+def flights_in_area(
+    request: Request,
+    min_lat: Optional[float] = None,
+    min_lon: Optional[float] = None,
+    max_lat: Optional[float] = None,
+    max_lon: Optional[float] = None,
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    radius_km: Optional[float] = None,
+    match: List[str] = Query(list(AREA_MATCHES)),
+    region: Optional[str] = None,
+    dof_from: Optional[date] = None,
+    dof_to: Optional[date] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+):
+    """Flights departing from or arriving at a point in a bounding box or
+    within `radius_km` of lat/lon, or whose ZONA reaches into it. Paged like
+    the flight list.
+    """
+    unknown = set(match) - set(AREA_MATCHES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"cannot match: {', '.join(sorted(unknown))}")
+    box = (min_lat, min_lon, max_lat, max_lon)
+    circle = (lat, lon, radius_km)
+    try:
+        if all(v is not None for v in box) and all(v is None for v in circle):
+            area = Area.box(*box)
+        elif all(v is not None for v in circle) and all(v is None for v in box):
+            area = Area.circle(*circle)
+        else:
+            raise InvalidArea("give either min_lat, min_lon, max_lat and max_lon or lat, lon and radius_km")
+        after = Cursor.decode(cursor) if cursor else None
+    except (InvalidArea, InvalidCursor) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filters = FlightFilter(region=region, dof_from=dof_from, dof_to=dof_to,
+                           area=area, area_match=tuple(m for m in AREA_MATCHES if m in match))
+    items, next_cursor = query_flights(request.app.state.engine, filters, limit, after)
+    return {
+        "items": items,
+        "next_cursor": next_cursor.encode() if next_cursor else None,
+    }
+
+@router.get('/daily')
+def daily_counts(
+    request: Request,
+    group_by: List[str] = Query(["region", "dof"]),
+    region: Optional[str] = None,
+    typ: Optional[str] = None,
+    dof_from: Optional[date] = None,
+    dof_to: Optional[date] = None,
+):
+    unknown = set(group_by) - set(ROLLUP_GROUPS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"cannot group by: {', '.join(sorted(unknown))}")
+    filters = FlightFilter(region=region, typ=typ, dof_from=dof_from, dof_to=dof_to)
+    return query_daily(request.app.state.engine, group_by, filters)
+
+@router.get('/{flight_id}')
+def flight(request: Request, flight_id: int):
+    found = get_flight(request.app.state.engine, flight_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="flight not found")
+    return found
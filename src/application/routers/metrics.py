@@ -0,0 +1,17 @@
+import os
+
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess
+
+
+router = APIRouter(tags=['Metrics'])
+
+@router.get('/metrics')
+def metrics():
+    # With several server workers each keeps its metrics in
+    # PROMETHEUS_MULTIPROC_DIR, and any of them reports the sum.
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
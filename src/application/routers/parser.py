@@ -1,11 +1,148 @@
-from fastapi import APIRouter, File, UploadFile
+import asyncio
+import json
+import zipfile
+from collections import deque
+from typing import List, Literal
 
-from application.utils.parser import parse_file
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from application.utils.jobs import Job, JobSnapshot, QueueFull
+from application.utils.upload import (
+    InvalidUpload, SpooledFile, UploadTooLarge, is_archive, spool_archive, spool_form,
+)
 
 
 router = APIRouter(prefix='/parser', tags=['Parser'])
 
-@router.post('/upload')
-async def upload(file: UploadFile = File(...)):
-    contents = await file.read()
-    parse_file(file.filename, contents)
\ No newline at end of file
+def _form_body(field: str, multiple: bool) -> dict:
+    """OpenAPI request body of an upload; the endpoints read the form themselves."""
+    schema = {"type": "string", "format": "binary"}
+    if multiple:
+        schema = {"type": "array", "items": schema}
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object", "required": [field], "properties": {field: schema},
+    }}}}}
+
+async def _spool_form(request: Request, field: str, max_files: int = 1) -> List[SpooledFile]:
+    try:
+        return await spool_form(request, field, request.app.state.config.upload, max_files)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidUpload as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def _submit(request: Request, file: SpooledFile, sink: str) -> Job:
+    """Queue the ingest of a spooled file; the job owns the spool from here on."""
+    config = request.app.state.config
+    engine = request.app.state.engine
+    pool = request.app.state.jobs.parse_pool
+
+    def task(job: Job):
+        # The parsing stack (pandas, openpyxl, pyarrow) is imported on first
+        # use, or preloaded before the server forks its workers.
+        from application.utils.export import export_file
+        from application.utils.parser import parse_file
+
+        with file.spool:
+            if sink == 'parquet':
+                return export_file(config.export.parquet_dir, file.filename, file.spool, config.ingest, job.progress,
+                                   file.fingerprint, pool)
+            return parse_file(engine, file.filename, file.spool, config.ingest, job.progress, file.fingerprint, pool)
+
+    try:
+        return request.app.state.jobs.submit(file.filename, task, file.close)
+    except BaseException:
+        file.close()
+        raise
+
+@router.post('/upload', status_code=202, openapi_extra=_form_body('file', multiple=False))
+async def upload(request: Request, sink: Literal['db', 'parquet'] = 'db'):
+    # The body is streamed into the spool rather than parsed up front, so an
+    # upload over UPLOAD_MAX_SIZE is refused as soon as it gets there.
+    file, = await _spool_form(request, 'file')
+
+    try:
+        job = _submit(request, file, sink)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return job.to_dict()
+
+@router.post('/upload/batch', status_code=202, openapi_extra=_form_body('files', multiple=True))
+async def upload_batch(request: Request, sink: Literal['db', 'parquet'] = 'db'):
+    """Queue one job per uploaded file and per CSV/XLSX member of uploaded ZIP archives.
+
+    The jobs run concurrently on the ingest pool. Files that cannot be queued
+    are reported with an error instead of failing the whole batch.
+    """
+    config = request.app.state.config
+    uploads = await _spool_form(request, 'files', config.upload.max_files)
+
+    results = []
+    # Files not handed to a job yet; a job closes its own spool.
+    pending = deque(uploads)
+    try:
+        while pending:
+            file = pending.popleft()
+            if file.error:
+                results.append({"filename": file.filename, "error": file.error})
+                continue
+
+            if is_archive(file.filename):
+                with file.spool:
+                    try:
+                        members = await run_in_threadpool(spool_archive, file.spool, config.upload)
+                    except (zipfile.BadZipFile, UploadTooLarge) as e:
+                        results.append({"filename": file.filename, "error": str(e)})
+                        continue
+                # Members come next, in place of their archive.
+                pending.extendleft(reversed(members))
+                continue
+
+            try:
+                results.append(_submit(request, file, sink).to_dict())
+            except QueueFull as e:
+                results.append({"filename": file.filename, "error": str(e)})
+    finally:
+        for file in pending:
+            file.close()
+    return {"files": results}
+
+@router.get('/jobs/{job_id}')
+def get_job(request: Request, job_id: str):
+    job = request.app.state.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job.to_dict()
+
+@router.get('/jobs/{job_id}/events')
+async def job_events(request: Request, job_id: str):
+    """Server-sent events with the job's status: `progress` every
+    INGEST_PROGRESS_INTERVAL seconds while it is queued or running, then one
+    `end` event when it has finished.
+
+    The stream samples the job's counters on its own schedule, so the ingest
+    itself does no extra work however many clients are listening. A job of
+    another server worker is followed through its published status.
+    """
+    jobs = request.app.state.jobs
+    job = await run_in_threadpool(jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    interval = request.app.state.config.ingest.progress_interval
+
+    async def events():
+        current = job
+        while not await request.is_disconnected():
+            finished = current.finished
+            data = json.dumps(current.to_dict(), ensure_ascii=False)
+            yield f"event: {'end' if finished else 'progress'}\ndata: {data}\n\n"
+            if finished:
+                return
+            await asyncio.sleep(interval)
+            if isinstance(current, JobSnapshot):
+                current = await run_in_threadpool(jobs.get, job_id) or current
+
+    return StreamingResponse(events(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
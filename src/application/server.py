@@ -0,0 +1,127 @@
+import importlib
+import json
+import logging
+import os
+import signal
+import socket
+import tempfile
+import time
+from typing import Set
+
+import uvicorn
+
+from configuration.config import Config
+
+
+logger = logging.getLogger(__name__)
+
+# Imported by the supervisor before forking, so every worker shares one copy
+# of the parsing stack instead of importing it on its first upload.
+PRELOAD = ["application.utils.parser", "application.utils.parallel", "application.utils.export"]
+
+
+def serve(config: Config, started_at: float):
+    """Run the API with `config.app.workers` worker processes.
+
+    One worker is a plain uvicorn server. More are forked from a supervisor
+    that has set up the schema and preloaded the parsing stack once; they
+    accept connections from one shared listening socket. The supervisor
+    replaces workers that die and on SIGTERM/SIGINT gives them
+    `graceful_timeout` seconds to finish before killing them.
+    """
+    if config.app.workers <= 1:
+        from application.app import create_app
+
+        uvicorn.run(create_app(config, started_at=started_at), host=config.app.host, port=config.app.port,
+                    backlog=config.app.backlog, timeout_graceful_shutdown=config.app.graceful_timeout)
+        return
+    _Supervisor(config, started_at).run()
+
+
+class _Supervisor:
+    def __init__(self, config: Config, started_at: float):
+        self._config = config
+        self._started_at = started_at
+        self._workers: Set[int] = set()
+        self._stopping = False
+
+    def run(self):
+        # Metrics are written to files shared by the workers; this must be set
+        # before prometheus_client is imported.
+        os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="prometheus-"))
+        from application.app import create_app
+        from application.utils.db import create_db_engine, drop_stale_loads, init_schema
+
+        for module in PRELOAD:
+            importlib.import_module(module)
+        # Schema changes run once here rather than racing in every worker.
+        engine = create_db_engine(self._config.db)
+        init_schema(engine, self._config.db.partitioned)
+        drop_stale_loads(engine, self._config.ingest.stage_retain_hours)
+        engine.dispose()
+
+        app = create_app(self._config, init_db=False, started_at=self._started_at)
+        sock = self._listen()
+        for _ in range(self._config.app.workers):
+            self._spawn(app, sock)
+        logger.info(json.dumps({
+            "event": "supervisor_ready",
+            "workers": self._config.app.workers,
+            "preload_seconds": round(time.monotonic() - self._started_at, 3),
+        }))
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        while self._workers and not self._stopping:
+            pid, status = os.wait()
+            self._workers.discard(pid)
+            if not self._stopping:
+                logger.warning(json.dumps({"event": "worker_exit", "pid": pid, "status": status}))
+                # Do not spin when workers cannot start, e.g. while the database is down.
+                time.sleep(1)
+                if not self._stopping:
+                    self._spawn(app, sock)
+        self._reap()
+        sock.close()
+
+    def _listen(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET6 if ":" in self._config.app.host else socket.AF_INET)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self._config.app.host, self._config.app.port))
+        sock.listen(self._config.app.backlog)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self, app, sock: socket.socket):
+        pid = os.fork()
+        if pid:
+            self._workers.add(pid)
+            return
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        server = uvicorn.Server(uvicorn.Config(app, timeout_graceful_shutdown=self._config.app.graceful_timeout))
+        try:
+            server.run(sockets=[sock])
+        finally:
+            os._exit(0)
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+        self._signal_workers(signal.SIGTERM)
+
+    def _signal_workers(self, signum: int):
+        for pid in list(self._workers):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _reap(self):
+        deadline = time.monotonic() + self._config.app.graceful_timeout + 5
+        while self._workers and time.monotonic() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                self._workers.discard(pid)
+            else:
+                time.sleep(0.1)
+        self._signal_workers(signal.SIGKILL)
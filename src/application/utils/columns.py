@@ -0,0 +1,20 @@
+from application.utils.geo import GEO_COLUMNS
+
+
+# Columns of a parsed frame, in the order they are loaded.
+FLIGHT_COLUMNS = [
+    "shr_col", "dep_col", "arr_col",
+    "f1", "f2", "f3",
+    "sid", "reg", "dep", "dest", "eet", "zona", "typ",
+    "dof", "dep_time", "arr_time", "block_minutes",
+    *GEO_COLUMNS,
+    "region", "file",
+]
+
+# Raw message columns of a parsed frame and the `flights` columns holding their hashes.
+RAW_COLUMNS = {"shr_col": "shr_hash", "dep_col": "dep_hash", "arr_col": "arr_hash"}
+DB_COLUMNS = [RAW_COLUMNS.get(column, column) for column in FLIGHT_COLUMNS]
+
+# Plan key and time of each row's own DEP and ARR message, loaded next to the
+# rows so that messages are joined to their plans over the whole file.
+MESSAGE_KEY_COLUMNS = ["dep_msg_sid", "dep_msg_dof", "dep_msg_time", "arr_msg_sid", "arr_msg_dof", "arr_msg_time"]
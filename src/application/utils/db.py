@@ -0,0 +1,859 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import URL, Engine
+
+from application.utils.columns import DB_COLUMNS
+from application.utils.geo import GEO_COLUMNS, KM_PER_DEGREE, decode_point, decode_zone, grid_cell
+from configuration.config import DataBaseConfig
+
+
+# Bounding box of a ZONA circle as (lon, lat) corners, for the zone index. The
+# longitude margin is taken at the edge farthest from the equator, so the box
+# holds the whole circle however large it is.
+_ZONA_LAT_MARGIN = f"zona_radius_km / {KM_PER_DEGREE}"
+_ZONA_LON_MARGIN = (f"zona_radius_km / ({KM_PER_DEGREE} * "
+                    f"greatest(cos(radians(least(abs(zona_lat) + {_ZONA_LAT_MARGIN}, 90))), 0.01))")
+_ZONA_BOX = (f"box(point(zona_lon - {_ZONA_LON_MARGIN}, zona_lat - {_ZONA_LAT_MARGIN}), "
+             f"point(zona_lon + {_ZONA_LON_MARGIN}, zona_lat + {_ZONA_LAT_MARGIN}))")
+
+TABLE_DDL = f"""
+CREATE TABLE IF NOT EXISTS flights (
+    id SERIAL PRIMARY KEY,
+    shr_hash BYTEA,
+    dep_hash BYTEA,
+    arr_hash BYTEA,
+    f1 TEXT,
+    f2 TEXT,
+    f3 TEXT,
+    sid TEXT,
+    reg TEXT,
+    dep TEXT,
+    dest TEXT,
+    eet TEXT,
+    zona TEXT,
+    typ TEXT,
+    dof DATE,
+    dep_time TIME,
+    arr_time TIME,
+    block_minutes SMALLINT,
+    dep_lat REAL,
+    dep_lon REAL,
+    dest_lat REAL,
+    dest_lon REAL,
+    zona_lat REAL,
+    zona_lon REAL,
+    zona_radius_km REAL,
+    dep_cell INTEGER,
+    dest_cell INTEGER,
+    zona_cell INTEGER,
+    region TEXT,
+    file TEXT
+);
+
+-- Tables created before block times were kept get them from the stored times.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = 'flights'
+          AND column_name = 'block_minutes'
+    ) THEN
+        ALTER TABLE flights ADD COLUMN block_minutes SMALLINT;
+        ALTER TABLE flights DISABLE TRIGGER USER;
+        UPDATE flights
+        SET block_minutes = (EXTRACT(EPOCH FROM arr_time - dep_time)::int / 60 + 1440) % 1440
+        WHERE dep_time IS NOT NULL AND arr_time IS NOT NULL;
+        ALTER TABLE flights ENABLE TRIGGER USER;
+    END IF;
+END
+$$;
+
+-- Decoded DEP/DEST/ZONA coordinates; see init_schema for rows stored before them.
+ALTER TABLE flights
+    ADD COLUMN IF NOT EXISTS dep_lat REAL,
+    ADD COLUMN IF NOT EXISTS dep_lon REAL,
+    ADD COLUMN IF NOT EXISTS dest_lat REAL,
+    ADD COLUMN IF NOT EXISTS dest_lon REAL,
+    ADD COLUMN IF NOT EXISTS zona_lat REAL,
+    ADD COLUMN IF NOT EXISTS zona_lon REAL,
+    ADD COLUMN IF NOT EXISTS zona_radius_km REAL,
+    ADD COLUMN IF NOT EXISTS dep_cell INTEGER,
+    ADD COLUMN IF NOT EXISTS dest_cell INTEGER,
+    ADD COLUMN IF NOT EXISTS zona_cell INTEGER;
+
+ALTER TABLE flights ADD COLUMN IF NOT EXISTS zona_box box GENERATED ALWAYS AS ({_ZONA_BOX}) STORED;
+"""
+
+# Raw messages are stored once, addressed by the SHA-256 of their text, and
+# referenced from `flights` by hash. Tables created before that kept the text in
+# shr_col/dep_col/arr_col; they are moved over once. Rollup triggers are paused
+# meanwhile since no counted column changes.
+MESSAGES_DDL = """
+CREATE TABLE IF NOT EXISTS raw_messages (
+    hash BYTEA PRIMARY KEY,
+    body TEXT NOT NULL
+);
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = 'flights'
+          AND column_name = 'shr_col'
+    ) THEN
+        ALTER TABLE flights
+            ADD COLUMN IF NOT EXISTS shr_hash BYTEA,
+            ADD COLUMN IF NOT EXISTS dep_hash BYTEA,
+            ADD COLUMN IF NOT EXISTS arr_hash BYTEA;
+        INSERT INTO raw_messages (hash, body)
+        SELECT sha256(convert_to(body, 'UTF8')), body
+        FROM (
+            SELECT shr_col AS body FROM flights
+            UNION SELECT dep_col FROM flights
+            UNION SELECT arr_col FROM flights
+        ) bodies
+        WHERE body IS NOT NULL
+        ON CONFLICT (hash) DO NOTHING;
+        ALTER TABLE flights DISABLE TRIGGER USER;
+        UPDATE flights SET
+            shr_hash = sha256(convert_to(shr_col, 'UTF8')),
+            dep_hash = sha256(convert_to(dep_col, 'UTF8')),
+            arr_hash = sha256(convert_to(arr_col, 'UTF8'));
+        ALTER TABLE flights ENABLE TRIGGER USER;
+        ALTER TABLE flights DROP COLUMN shr_col, DROP COLUMN dep_col, DROP COLUMN arr_col;
+    END IF;
+END
+$$;
+"""
+
+_NATURAL_KEY = ["sid", "dof", "region"]
+# In the 2024 layout a plan's SHR, DEP and ARR messages are separate rows that
+# share its key. These columns come from whichever of them has them; the rest
+# describe the plan and come from its SHR row.
+_MESSAGE_COLUMNS = ["shr_hash", "dep_hash", "arr_hash", "f1", "f2", "f3", "dep_time", "arr_time", "block_minutes"]
+# Rows without a SID have no natural key; they are told apart by their region,
+# DOF and messages, so loading them again, from this or a corrected file,
+# updates them instead of adding copies.
+_KEYLESS_KEY = ["region", "dof", "shr_hash", "dep_hash", "arr_hash"]
+_RECORD_KEYLESS_KEY = ["region_id", "dof", "shr_hash", "dep_hash", "arr_hash"]
+
+
+def _list(columns, prefix: str = "") -> str:
+    return ", ".join(f"{prefix}{c}" for c in columns)
+
+def _merged(columns, order: str) -> str:
+    """Aggregates that fold the rows of one key, grouped by it, into one record.
+
+    The latest row by `order` wins: for message columns the latest that has
+    a value, for the others the latest SHR row, or the latest row without one.
+    """
+    merged = []
+    for c in columns:
+        if c in _NATURAL_KEY:
+            merged.append(c)
+        elif c in _MESSAGE_COLUMNS:
+            merged.append(f"(array_agg({c} ORDER BY {order} DESC) FILTER (WHERE {c} IS NOT NULL))[1] AS {c}")
+        else:
+            merged.append(f"(array_agg({c} ORDER BY shr_hash IS NULL, {order} DESC))[1] AS {c}")
+    return ", ".join(merged)
+
+# Natural key of a flight plan. When the index is first created, existing
+# duplicates are merged into their latest row and the others deleted.
+NATURAL_KEY_DDL = f"""
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_indexes
+        WHERE schemaname = current_schema()
+          AND indexname = 'flights_natural_key_idx'
+    ) THEN
+        UPDATE flights f
+        SET ({_list(c for c in DB_COLUMNS if c not in _NATURAL_KEY)})
+          = ({_list((c for c in DB_COLUMNS if c not in _NATURAL_KEY), "d.")})
+        FROM (
+            SELECT max(id) AS id, {_merged(DB_COLUMNS, "id")}
+            FROM flights
+            WHERE sid IS NOT NULL
+            GROUP BY {_list(_NATURAL_KEY)}
+            HAVING count(*) > 1
+        ) d
+        WHERE f.id = d.id;
+        DELETE FROM flights a
+        USING flights b
+        WHERE a.sid IS NOT NULL
+          AND a.sid = b.sid
+          AND a.dof IS NOT DISTINCT FROM b.dof
+          AND a.region IS NOT DISTINCT FROM b.region
+          AND a.id < b.id;
+        CREATE UNIQUE INDEX flights_natural_key_idx
+            ON flights (sid, dof, region) NULLS NOT DISTINCT
+            WHERE sid IS NOT NULL;
+    END IF;
+END
+$$;
+DROP INDEX IF EXISTS flights_keyless_file_idx;
+DROP INDEX IF EXISTS flights_keyless_fingerprint_idx;
+ALTER TABLE flights DROP COLUMN IF EXISTS fingerprint;
+
+-- When the index is first created, duplicate keyless rows are reduced to their latest.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_indexes
+        WHERE schemaname = current_schema()
+          AND indexname = 'flights_keyless_key_idx'
+    ) THEN
+        DELETE FROM flights
+        WHERE id IN (
+            SELECT id
+            FROM (
+                SELECT id, row_number() OVER (PARTITION BY {_list(_KEYLESS_KEY)} ORDER BY id DESC) AS n
+                FROM flights
+                WHERE sid IS NULL
+            ) d
+            WHERE n > 1
+        );
+        CREATE UNIQUE INDEX flights_keyless_key_idx
+            ON flights ({_list(_KEYLESS_KEY)}) NULLS NOT DISTINCT
+            WHERE sid IS NULL;
+    END IF;
+END
+$$;
+"""
+
+# Read API: each filter column leads an index that is already ordered for the
+# (dof, id) keyset, so a page is a single range scan.
+QUERY_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS flights_dof_id_idx ON flights (dof, id);
+CREATE INDEX IF NOT EXISTS flights_region_dof_id_idx ON flights (region, dof, id);
+CREATE INDEX IF NOT EXISTS flights_dep_dof_id_idx ON flights (dep, dof, id);
+CREATE INDEX IF NOT EXISTS flights_dest_dof_id_idx ON flights (dest, dof, id);
+CREATE INDEX IF NOT EXISTS flights_typ_dof_id_idx ON flights (typ, dof, id);
+CREATE INDEX IF NOT EXISTS flights_reg_dof_id_idx ON flights (reg, dof, id);
+CREATE INDEX IF NOT EXISTS flights_dep_cell_dof_idx ON flights (dep_cell, dof);
+CREATE INDEX IF NOT EXISTS flights_dest_cell_dof_idx ON flights (dest_cell, dof);
+DROP INDEX IF EXISTS flights_zona_cell_dof_idx;
+CREATE INDEX IF NOT EXISTS flights_zona_box_idx ON flights USING gist (zona_box);
+"""
+
+# Flight counts per region, DOF, aircraft type and departure hour. Statement
+# triggers apply each write's net change from its transition tables, so a
+# batch, a re-ingest or a delete costs O(groups touched), not a re-aggregation.
+# The table is filled from `flights` once, when it is created. `{table}` is the
+# table the triggers sit on, `{changes}` reads its rows from a transition table.
+_ROLLUP_DDL = """
+DO $$
+BEGIN
+    IF to_regclass('flights_daily') IS NULL THEN
+        CREATE TABLE flights_daily (
+            region TEXT,
+            dof DATE,
+            typ TEXT,
+            dep_hour SMALLINT,
+            flights BIGINT NOT NULL,
+            UNIQUE NULLS NOT DISTINCT (region, dof, typ, dep_hour)
+        );
+        INSERT INTO flights_daily (region, dof, typ, dep_hour, flights)
+        SELECT region, dof, typ, EXTRACT(HOUR FROM dep_time), count(*)
+        FROM flights
+        GROUP BY 1, 2, 3, 4;
+    END IF;
+END
+$$;
+
+CREATE INDEX IF NOT EXISTS flights_daily_dof_idx ON flights_daily (dof);
+CREATE INDEX IF NOT EXISTS flights_daily_empty_idx ON flights_daily (dof) WHERE flights = 0;
+
+CREATE OR REPLACE FUNCTION flights_daily_apply() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        TRUNCATE flights_daily;
+        RETURN NULL;
+    END IF;
+
+    CREATE TEMP TABLE IF NOT EXISTS flights_daily_delta (
+        region TEXT, dof DATE, typ TEXT, dep_hour SMALLINT, flights BIGINT
+    ) ON COMMIT DELETE ROWS;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO flights_daily_delta
+        {changes_new};
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO flights_daily_delta
+        {changes_old};
+    END IF;
+
+    -- Sorted so that concurrent batches lock shared groups in the same order.
+    INSERT INTO flights_daily AS d (region, dof, typ, dep_hour, flights)
+    SELECT region, dof, typ, dep_hour, sum(flights)
+    FROM flights_daily_delta
+    GROUP BY 1, 2, 3, 4
+    HAVING sum(flights) <> 0
+    ORDER BY 1, 2, 3, 4
+    ON CONFLICT (region, dof, typ, dep_hour) DO UPDATE SET flights = d.flights + EXCLUDED.flights;
+
+    IF TG_OP <> 'INSERT' THEN
+        -- Only groups touched above can have dropped to zero.
+        DELETE FROM flights_daily WHERE flights = 0;
+    END IF;
+    TRUNCATE flights_daily_delta;
+    RETURN NULL;
+END
+$$;
+
+-- Recounts the DOFs in [from_dof, to_dof) from `flights`, after changes the
+-- triggers do not see, such as a detached partition. Writers wait meanwhile.
+CREATE OR REPLACE FUNCTION flights_daily_rebuild(from_dof DATE, to_dof DATE) RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    LOCK TABLE flights_daily IN EXCLUSIVE MODE;
+    DELETE FROM flights_daily WHERE dof >= from_dof AND dof < to_dof;
+    INSERT INTO flights_daily (region, dof, typ, dep_hour, flights)
+    SELECT region, dof, typ, EXTRACT(HOUR FROM dep_time), count(*)
+    FROM flights
+    WHERE dof >= from_dof AND dof < to_dof
+    GROUP BY 1, 2, 3, 4;
+END
+$$;
+
+CREATE OR REPLACE TRIGGER flights_daily_insert AFTER INSERT ON {table}
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION flights_daily_apply();
+CREATE OR REPLACE TRIGGER flights_daily_update AFTER UPDATE ON {table}
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION flights_daily_apply();
+CREATE OR REPLACE TRIGGER flights_daily_delete AFTER DELETE ON {table}
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION flights_daily_apply();
+CREATE OR REPLACE TRIGGER flights_daily_truncate AFTER TRUNCATE ON {table}
+    FOR EACH STATEMENT EXECUTE FUNCTION flights_daily_apply();
+"""
+
+_PLAIN_CHANGES = "SELECT region, dof, typ, EXTRACT(HOUR FROM dep_time), {sign} FROM {rows}"
+_PARTITIONED_CHANGES = (
+    "SELECT r.name, n.dof, t.name, EXTRACT(HOUR FROM n.dep_at), {sign} FROM {rows} n "
+    "LEFT JOIN regions r ON r.id = n.region_id LEFT JOIN aircraft_types t ON t.id = n.typ_id"
+)
+
+def _rollup_ddl(table: str, changes: str) -> str:
+    return _ROLLUP_DDL.format(
+        table=table,
+        changes_new=changes.format(sign=1, rows="new_rows"),
+        changes_old=changes.format(sign=-1, rows="old_rows"),
+    )
+
+FILES_DDL = """
+CREATE TABLE IF NOT EXISTS ingested_files (
+    fingerprint TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    rows BIGINT NOT NULL,
+    ingested_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+# Each batch is COPYed into this session-local table in the plain layout, then
+# handed to flights_merge_batch(), which each schema mode defines for its own
+# tables.
+STAGE_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS flights_batch (
+    shr_hash BYTEA,
+    dep_hash BYTEA,
+    arr_hash BYTEA,
+    f1 TEXT,
+    f2 TEXT,
+    f3 TEXT,
+    sid TEXT,
+    reg TEXT,
+    dep TEXT,
+    dest TEXT,
+    eet TEXT,
+    zona TEXT,
+    typ TEXT,
+    dof DATE,
+    dep_time TIME,
+    arr_time TIME,
+    block_minutes SMALLINT,
+    dep_lat REAL,
+    dep_lon REAL,
+    dest_lat REAL,
+    dest_lon REAL,
+    zona_lat REAL,
+    zona_lon REAL,
+    zona_radius_km REAL,
+    dep_cell INTEGER,
+    dest_cell INTEGER,
+    zona_cell INTEGER,
+    region TEXT,
+    file TEXT
+) ON COMMIT DELETE ROWS;
+CREATE TEMP TABLE IF NOT EXISTS messages_batch (hash BYTEA, body TEXT) ON COMMIT DELETE ROWS;
+"""
+
+# A file being loaded is COPYed into an unlogged table of its own, named after
+# its fingerprint, and moved into `flights` in one transaction once it has been
+# read completely. `frame_no` ties staged rows to the checkpoint below, and
+# the MESSAGE_KEY_COLUMNS let the DEP/ARR messages be joined to their plans
+# over the whole file when it is moved.
+LOAD_STAGE_DDL = """
+CREATE UNLOGGED TABLE IF NOT EXISTS {table} (
+    row_no BIGINT GENERATED ALWAYS AS IDENTITY,
+    frame_no INTEGER NOT NULL,
+    LIKE flights_batch
+);
+ALTER TABLE {table}
+    ADD COLUMN IF NOT EXISTS dep_msg_sid TEXT,
+    ADD COLUMN IF NOT EXISTS dep_msg_dof DATE,
+    ADD COLUMN IF NOT EXISTS dep_msg_time TIME,
+    ADD COLUMN IF NOT EXISTS arr_msg_sid TEXT,
+    ADD COLUMN IF NOT EXISTS arr_msg_dof DATE,
+    ADD COLUMN IF NOT EXISTS arr_msg_time TIME;
+"""
+
+# How far each unfinished load got: the frames staged so far and where the
+# reader stands after them. `carry` is the carry-over state as JSON.
+CHECKPOINT_DDL = """
+CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+    fingerprint TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    stage_table TEXT NOT NULL,
+    frames INTEGER NOT NULL,
+    rows BIGINT NOT NULL,
+    sheet TEXT,
+    sheet_rows BIGINT NOT NULL,
+    carry JSONB,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Checkpoints from when the state was pickled are dropped; their loads start over.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = 'ingest_checkpoints'
+          AND column_name = 'carry'
+          AND data_type = 'bytea'
+    ) THEN
+        DELETE FROM ingest_checkpoints;
+        ALTER TABLE ingest_checkpoints ALTER COLUMN carry TYPE JSONB USING NULL;
+    END IF;
+END
+$$;
+"""
+
+# Status of ingest jobs when the server runs several workers; see JobStore.
+JOBS_DDL = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id TEXT PRIMARY KEY,
+    status JSONB NOT NULL,
+    finished BOOLEAN NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+def _upsert(columns, key, messages, table: str) -> str:
+    """`DO UPDATE` of a merged record: messages the record lacks are kept from
+    the stored row, and the row is only rewritten when a value changed."""
+    values = {c: f"coalesce(EXCLUDED.{c}, {table}.{c})" if c in messages else f"EXCLUDED.{c}"
+              for c in columns if c not in key}
+    return (
+        f"DO UPDATE SET {', '.join(f'{c} = {v}' for c, v in values.items())} "
+        f"WHERE ({_list(values, f'{table}.')}) IS DISTINCT FROM ({', '.join(values.values())})"
+    )
+
+# A batch is merged by key first, so rows of one plan in other batches or
+# files add to its record rather than replace it.
+_MERGED_BATCH = f"""
+    SELECT {_merged(DB_COLUMNS, "ctid")}
+    FROM flights_batch
+    WHERE sid IS NOT NULL
+    GROUP BY {_list(_NATURAL_KEY)}
+    ORDER BY {_list(_NATURAL_KEY)}
+"""
+# Keyless rows of a batch, the latest of each identity.
+_KEYLESS_BATCH = f"""
+    SELECT DISTINCT ON ({_list(_KEYLESS_KEY)}) *
+    FROM flights_batch
+    WHERE sid IS NULL
+    ORDER BY {_list(_KEYLESS_KEY)}, ctid DESC
+"""
+
+PLAIN_WRITE_DDL = f"""
+CREATE OR REPLACE FUNCTION flights_merge_batch() RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO flights ({_list(DB_COLUMNS)})
+    {_MERGED_BATCH}
+    ON CONFLICT ({_list(_NATURAL_KEY)}) WHERE sid IS NOT NULL
+    {_upsert(DB_COLUMNS, _NATURAL_KEY, _MESSAGE_COLUMNS, "flights")};
+
+    INSERT INTO flights ({_list(DB_COLUMNS)})
+    SELECT {_list(DB_COLUMNS)} FROM ({_KEYLESS_BATCH}) b
+    ON CONFLICT ({_list(_KEYLESS_KEY)}) WHERE sid IS NULL
+    {_upsert(DB_COLUMNS, _KEYLESS_KEY, (), "flights")};
+END
+$$;
+
+DROP FUNCTION IF EXISTS flights_remove_keyless(TEXT);
+"""
+
+# Partitioned mode: `flight_records` is range-partitioned by DOF month, with
+# timestamps instead of separate times, EET also in minutes and region, typ and
+# file as keys into lookup tables. Partitions are created by flights_merge_batch()
+# as months show up; rows without a DOF go to the default partition. `flights`
+# is a view in the plain layout, so readers and the rollup work in both modes.
+# A month is taken out of the table and flights_daily with
+#   SELECT flight_records_detach_month('YYYY-MM-01')
+# which leaves the detached table to be archived or dropped.
+PARTITIONED_TABLE_DDL = f"""
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('flights') AND relkind = 'r') THEN
+        RAISE EXCEPTION 'flights is a plain table; the partitioned schema needs an empty database';
+    END IF;
+END
+$$;
+
+CREATE TABLE IF NOT EXISTS regions (
+    id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS aircraft_types (
+    id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS source_files (
+    id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS flight_records (
+    id BIGINT GENERATED ALWAYS AS IDENTITY,
+    shr_hash BYTEA,
+    dep_hash BYTEA,
+    arr_hash BYTEA,
+    f1 TEXT,
+    f2 TEXT,
+    f3 TEXT,
+    sid TEXT,
+    reg TEXT,
+    dep TEXT,
+    dest TEXT,
+    eet TEXT,
+    eet_minutes SMALLINT,
+    zona TEXT,
+    typ_id INTEGER,
+    dof DATE,
+    dep_at TIMESTAMP,
+    arr_at TIMESTAMP,
+    region_id INTEGER,
+    file_id INTEGER,
+    block_minutes SMALLINT,
+    dep_lat REAL,
+    dep_lon REAL,
+    dest_lat REAL,
+    dest_lon REAL,
+    zona_lat REAL,
+    zona_lon REAL,
+    zona_radius_km REAL,
+    dep_cell INTEGER,
+    dest_cell INTEGER,
+    zona_cell INTEGER
+) PARTITION BY RANGE (dof);
+ALTER TABLE flight_records
+    ADD COLUMN IF NOT EXISTS eet TEXT,
+    ADD COLUMN IF NOT EXISTS block_minutes SMALLINT,
+    ADD COLUMN IF NOT EXISTS dep_lat REAL,
+    ADD COLUMN IF NOT EXISTS dep_lon REAL,
+    ADD COLUMN IF NOT EXISTS dest_lat REAL,
+    ADD COLUMN IF NOT EXISTS dest_lon REAL,
+    ADD COLUMN IF NOT EXISTS zona_lat REAL,
+    ADD COLUMN IF NOT EXISTS zona_lon REAL,
+    ADD COLUMN IF NOT EXISTS zona_radius_km REAL,
+    ADD COLUMN IF NOT EXISTS dep_cell INTEGER,
+    ADD COLUMN IF NOT EXISTS dest_cell INTEGER,
+    ADD COLUMN IF NOT EXISTS zona_cell INTEGER;
+ALTER TABLE flight_records ADD COLUMN IF NOT EXISTS zona_box box GENERATED ALWAYS AS ({_ZONA_BOX}) STORED;
+
+-- The CHECK lets new month partitions be created without scanning this one.
+CREATE TABLE IF NOT EXISTS flight_records_undated PARTITION OF flight_records (
+    CONSTRAINT flight_records_undated_dof CHECK (dof IS NULL)
+) DEFAULT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS flight_records_natural_key_idx
+    ON flight_records (sid, dof, region_id) NULLS NOT DISTINCT
+    WHERE sid IS NOT NULL;
+DROP INDEX IF EXISTS flight_records_keyless_file_idx;
+DROP INDEX IF EXISTS flight_records_keyless_fingerprint_idx;
+ALTER TABLE flight_records DROP COLUMN IF EXISTS fingerprint;
+-- See _KEYLESS_KEY. When the index is first created, duplicate keyless rows
+-- are reduced to their latest.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_indexes
+        WHERE schemaname = current_schema()
+          AND indexname = 'flight_records_keyless_key_idx'
+    ) THEN
+        DELETE FROM flight_records
+        WHERE id IN (
+            SELECT id
+            FROM (
+                SELECT id, row_number() OVER (PARTITION BY {_list(_RECORD_KEYLESS_KEY)} ORDER BY id DESC) AS n
+                FROM flight_records
+                WHERE sid IS NULL
+            ) d
+            WHERE n > 1
+        );
+        CREATE UNIQUE INDEX flight_records_keyless_key_idx
+            ON flight_records ({_list(_RECORD_KEYLESS_KEY)}) NULLS NOT DISTINCT
+            WHERE sid IS NULL;
+    END IF;
+END
+$$;
+CREATE INDEX IF NOT EXISTS flight_records_id_idx ON flight_records (id);
+CREATE INDEX IF NOT EXISTS flight_records_dof_id_idx ON flight_records (dof, id);
+CREATE INDEX IF NOT EXISTS flight_records_region_dof_id_idx ON flight_records (region_id, dof, id);
+CREATE INDEX IF NOT EXISTS flight_records_dep_dof_id_idx ON flight_records (dep, dof, id);
+CREATE INDEX IF NOT EXISTS flight_records_dest_dof_id_idx ON flight_records (dest, dof, id);
+CREATE INDEX IF NOT EXISTS flight_records_typ_dof_id_idx ON flight_records (typ_id, dof, id);
+CREATE INDEX IF NOT EXISTS flight_records_reg_dof_id_idx ON flight_records (reg, dof, id);
+CREATE INDEX IF NOT EXISTS flight_records_dep_cell_dof_idx ON flight_records (dep_cell, dof);
+CREATE INDEX IF NOT EXISTS flight_records_dest_cell_dof_idx ON flight_records (dest_cell, dof);
+DROP INDEX IF EXISTS flight_records_zona_cell_dof_idx;
+CREATE INDEX IF NOT EXISTS flight_records_zona_box_idx ON flight_records USING gist (zona_box);
+
+-- The view used to show eet as an interval made from eet_minutes. Rows stored
+-- then get the HHMM back; the FIR before it was not kept.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = 'flights'
+          AND column_name = 'eet'
+          AND data_type = 'interval'
+    ) THEN
+        DROP VIEW flights;
+        UPDATE flight_records SET eet = to_char(make_interval(mins => eet_minutes), 'HH24MI')
+        WHERE eet IS NULL AND eet_minutes IS NOT NULL;
+    END IF;
+END
+$$;
+CREATE OR REPLACE VIEW flights AS
+SELECT f.id, f.shr_hash, f.dep_hash, f.arr_hash, f.f1, f.f2, f.f3,
+       f.sid, f.reg, f.dep, f.dest, f.eet, f.zona,
+       t.name AS typ, f.dof, f.dep_at::time AS dep_time, f.arr_at::time AS arr_time,
+       r.name AS region, s.name AS file, f.block_minutes,
+       f.dep_lat, f.dep_lon, f.dest_lat, f.dest_lon, f.zona_lat, f.zona_lon, f.zona_radius_km,
+       f.dep_cell, f.dest_cell, f.zona_cell, f.zona_box
+FROM flight_records f
+LEFT JOIN aircraft_types t ON t.id = f.typ_id
+LEFT JOIN regions r ON r.id = f.region_id
+LEFT JOIN source_files s ON s.id = f.file_id;
+
+CREATE OR REPLACE FUNCTION flight_records_ensure_partition(month DATE) RETURNS void
+LANGUAGE plpgsql AS $$
+DECLARE
+    partition TEXT := format('flight_records_%s', to_char(month, 'YYYY_MM'));
+BEGIN
+    IF to_regclass(partition) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF flight_records FOR VALUES FROM (%L) TO (%L)',
+            partition, month, (month + interval '1 month')::date
+        );
+    END IF;
+EXCEPTION WHEN duplicate_table THEN
+    -- Created by a concurrent batch.
+    NULL;
+END
+$$;
+
+-- Not CONCURRENTLY: that is not possible next to a default partition.
+CREATE OR REPLACE FUNCTION flight_records_detach_month(month DATE) RETURNS void
+LANGUAGE plpgsql AS $$
+DECLARE
+    first DATE := date_trunc('month', month)::date;
+BEGIN
+    EXECUTE format('ALTER TABLE flight_records DETACH PARTITION %I',
+                   format('flight_records_%s', to_char(first, 'YYYY_MM')));
+    PERFORM flights_daily_rebuild(first, (first + interval '1 month')::date);
+END
+$$;
+"""
+
+_RECORD_COLUMNS = [
+    "shr_hash", "dep_hash", "arr_hash", "f1", "f2", "f3", "sid", "reg", "dep", "dest",
+    "eet", "eet_minutes", "zona", "typ_id", "dof", "dep_at", "arr_at", "region_id", "file_id", "block_minutes",
+    *GEO_COLUMNS,
+]
+_RECORD_MESSAGES = ["shr_hash", "dep_hash", "arr_hash", "f1", "f2", "f3", "dep_at", "arr_at", "block_minutes"]
+
+def _record_select(source: str, *extra: str) -> str:
+    """`source` (as b) joined to the lookup tables, in _RECORD_COLUMNS order
+    followed by `extra`.
+
+    An arrival time earlier than the departure is taken to be on the next day.
+    """
+    return f"""
+    b.shr_hash, b.dep_hash, b.arr_hash, b.f1, b.f2, b.f3, b.sid, b.reg, b.dep, b.dest, b.eet,
+    CASE WHEN b.eet ~ '[0-9]{{4}}$'
+         THEN substr(right(b.eet, 4), 1, 2)::int * 60 + right(b.eet, 2)::int END,
+    b.zona, t.id, b.dof, b.dof + b.dep_time,
+    b.dof + b.arr_time + CASE WHEN b.arr_time < b.dep_time THEN interval '1 day' ELSE interval '0' END,
+    r.id, s.id, b.block_minutes, {_list([*GEO_COLUMNS, *extra], "b.")}
+FROM {source}
+LEFT JOIN aircraft_types t ON t.name = b.typ
+LEFT JOIN regions r ON r.name = b.region
+LEFT JOIN source_files s ON s.name = b.file
+"""
+
+PARTITIONED_WRITE_DDL = f"""
+CREATE OR REPLACE FUNCTION flights_merge_batch() RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO regions (name)
+    SELECT DISTINCT region FROM flights_batch WHERE region IS NOT NULL ORDER BY 1
+    ON CONFLICT (name) DO NOTHING;
+    INSERT INTO aircraft_types (name)
+    SELECT DISTINCT typ FROM flights_batch WHERE typ IS NOT NULL ORDER BY 1
+    ON CONFLICT (name) DO NOTHING;
+    INSERT INTO source_files (name)
+    SELECT DISTINCT file FROM flights_batch WHERE file IS NOT NULL ORDER BY 1
+    ON CONFLICT (name) DO NOTHING;
+
+    PERFORM flight_records_ensure_partition(month)
+    FROM (SELECT DISTINCT date_trunc('month', dof)::date AS month FROM flights_batch WHERE dof IS NOT NULL) months;
+
+    INSERT INTO flight_records ({_list(_RECORD_COLUMNS)})
+    SELECT {_record_select(f"({_MERGED_BATCH}) b")}
+    ORDER BY b.sid, b.dof, b.region
+    ON CONFLICT (sid, dof, region_id) WHERE sid IS NOT NULL
+    {_upsert(_RECORD_COLUMNS, ("sid", "dof", "region_id"), _RECORD_MESSAGES, "flight_records")};
+
+    INSERT INTO flight_records ({_list(_RECORD_COLUMNS)})
+    SELECT {_record_select(f"({_KEYLESS_BATCH}) b")}
+    ON CONFLICT ({_list(_RECORD_KEYLESS_KEY)}) WHERE sid IS NULL
+    {_upsert(_RECORD_COLUMNS, _RECORD_KEYLESS_KEY, (), "flight_records")};
+END
+$$;
+
+DROP FUNCTION IF EXISTS flights_remove_keyless(TEXT);
+"""
+
+
+def create_db_engine(config: DataBaseConfig) -> Engine:
+    url = URL.create(
+        "postgresql",
+        username=config.database_user,
+        password=config.database_password,
+        host=config.database_host,
+        port=config.database_port,
+        database=config.database_name,
+    )
+    return create_engine(
+        url,
+        pool_size=config.pool_size,
+        max_overflow=config.pool_max_overflow,
+        pool_pre_ping=config.pool_pre_ping,
+    )
+
+def _lacks_geometry(conn, table: str) -> bool:
+    return conn.execute(text("""
+        SELECT to_regclass(:table) IS NOT NULL AND NOT EXISTS (
+            SELECT 1
+            FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name = :table
+              AND column_name = 'dep_cell'
+        )
+    """), {"table": table}).scalar()
+
+def _backfill_geometry(conn, table: str):
+    """Decode the coordinates of rows stored before they were decoded at ingest.
+
+    Each distinct DEP/DEST/ZONA value is decoded once and joined back. Rollup
+    triggers are paused meanwhile since no counted column changes.
+    """
+    conn.execute(text(
+        "CREATE TEMP TABLE geometry_lookup (value TEXT PRIMARY KEY, lat REAL, lon REAL, radius_km REAL, cell INTEGER) "
+        "ON COMMIT DROP"
+    ))
+    conn.execute(text(f"ALTER TABLE {table} DISABLE TRIGGER USER"))
+    for column, decoder in (("dep", decode_point), ("dest", decode_point), ("zona", decode_zone)):
+        rows = []
+        for value in conn.execute(text(f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL")).scalars():
+            decoded = decoder(value)
+            if decoded is not None:
+                lat, lon, *radius = decoded
+                rows.append({"value": value, "lat": lat, "lon": lon,
+                             "radius_km": radius[0] if radius else None, "cell": grid_cell(lat, lon)})
+        if not rows:
+            continue
+        conn.execute(text("TRUNCATE geometry_lookup"))
+        conn.execute(text("INSERT INTO geometry_lookup VALUES (:value, :lat, :lon, :radius_km, :cell)"), rows)
+        radius = ", zona_radius_km = g.radius_km" if column == "zona" else ""
+        conn.execute(text(f"""
+            UPDATE {table} f
+            SET {column}_lat = g.lat, {column}_lon = g.lon, {column}_cell = g.cell{radius}
+            FROM geometry_lookup g
+            WHERE g.value = f.{column}
+        """))
+    conn.execute(text(f"ALTER TABLE {table} ENABLE TRIGGER USER"))
+
+def init_schema(engine: Engine, partitioned: bool = False):
+    if partitioned:
+        statements = (
+            PARTITIONED_TABLE_DDL, MESSAGES_DDL, PARTITIONED_WRITE_DDL,
+            _rollup_ddl("flight_records", _PARTITIONED_CHANGES), FILES_DDL, CHECKPOINT_DDL, JOBS_DDL,
+        )
+    else:
+        statements = (
+            TABLE_DDL, MESSAGES_DDL, NATURAL_KEY_DDL, QUERY_INDEX_DDL, PLAIN_WRITE_DDL,
+            _rollup_ddl("flights", _PLAIN_CHANGES), FILES_DDL, CHECKPOINT_DDL, JOBS_DDL,
+        )
+    table = "flight_records" if partitioned else "flights"
+    with engine.begin() as conn:
+        backfill = _lacks_geometry(conn, table)
+        for ddl in statements:
+            conn.execute(text(ddl))
+        if backfill:
+            _backfill_geometry(conn, table)
+
+# Staging tables with their checkpoint, if any; see drop_stale_loads.
+_STAGE_TABLES_SQL = text(r"""
+SELECT c.relname, k.fingerprint, k.updated_at < now() - make_interval(hours => :hours) AS expired
+FROM pg_class c
+LEFT JOIN ingest_checkpoints k ON k.stage_table = c.relname
+WHERE c.relnamespace = current_schema()::regnamespace
+  AND c.relkind = 'r'
+  AND c.relname LIKE 'ingest\_stage\_%'
+""")
+
+def drop_stale_loads(engine: Engine, retain_hours: int) -> int:
+    """Drop the staging tables of loads that will not be resumed, with their checkpoints.
+
+    Those are loads checkpointed more than `retain_hours` ago, and loads
+    without a checkpoint, which would start over anyway. Tables of loads in
+    progress are left alone. Returns the number of tables dropped.
+    """
+    with engine.connect() as conn:
+        tables = conn.execute(_STAGE_TABLES_SQL, {"hours": retain_hours}).fetchall()
+    dropped = 0
+    for table, fingerprint, expired in tables:
+        if fingerprint is not None and not expired:
+            continue
+        with engine.begin() as conn:
+            # Held by StagedLoad for as long as it uses the table.
+            if not conn.execute(text("SELECT pg_try_advisory_xact_lock(hashtext(:table))"), {"table": table}).scalar():
+                continue
+            conn.execute(text(f'DROP TABLE IF EXISTS "{table}"'))
+            conn.execute(text("DELETE FROM ingest_checkpoints WHERE stage_table = :table"), {"table": table})
+        dropped += 1
+    return dropped
@@ -0,0 +1,283 @@
+import fcntl
+import glob
+import hashlib
+import os
+import time
+import uuid
+from concurrent.futures import Executor
+from typing import BinaryIO, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from application.utils.geo import GEO_COLUMNS
+from application.utils.metrics import observe_stage
+from application.utils.parser import UNSUPPORTED_FILE, iter_flight_frames
+from application.utils.progress import IngestProgress
+from configuration.config import IngestConfig
+
+
+PARTITION_NULL = "__HIVE_DEFAULT_PARTITION__"
+
+# `region` and `dof_month` live in the hive-style directory names, not in the files.
+PARQUET_SCHEMA = pa.schema([
+    ("shr_col", pa.string()),
+    ("dep_col", pa.string()),
+    ("arr_col", pa.string()),
+    ("f1", pa.dictionary(pa.int32(), pa.string())),
+    ("f2", pa.dictionary(pa.int32(), pa.string())),
+    ("f3", pa.dictionary(pa.int32(), pa.string())),
+    ("sid", pa.string()),
+    ("reg", pa.string()),
+    ("dep", pa.string()),
+    ("dest", pa.string()),
+    ("eet", pa.string()),
+    ("zona", pa.string()),
+    ("typ", pa.dictionary(pa.int32(), pa.string())),
+    ("dof", pa.date32()),
+    ("dep_time", pa.time32("s")),
+    ("arr_time", pa.time32("s")),
+    ("block_minutes", pa.int16()),
+    *((column, pa.int32() if column.endswith("_cell") else pa.float32()) for column in GEO_COLUMNS),
+    ("file", pa.dictionary(pa.int32(), pa.string())),
+])
+
+# Staged chunks also keep the message keys and their order in the file, which
+# `commit()` needs to join DEP/ARR over the whole file.
+_STAGE_SCHEMA = pa.schema([
+    *PARQUET_SCHEMA,
+    *((f"{key}_msg_sid", pa.string()) for key in ("dep", "arr")),
+    *((f"{key}_msg_dof", pa.date32()) for key in ("dep", "arr")),
+    *((f"{key}_msg_time", pa.time32("s")) for key in ("dep", "arr")),
+    ("row_no", pa.int64()),
+])
+
+# As in the database: a plan's record takes these from whichever of its rows
+# has them, the latest one winning, and the rest from its latest SHR row.
+_MESSAGE_COLUMNS = ["shr_col", "dep_col", "arr_col", "f1", "f2", "f3", "dep_time", "arr_time", "block_minutes"]
+
+
+def _partition_value(value) -> str:
+    return PARTITION_NULL if value is None else quote(str(value), safe="")
+
+def _month(dof) -> Optional[str]:
+    return None if dof is None else f"{dof.year:04d}-{dof.month:02d}"
+
+
+class ParquetDataset:
+    """Flights of one source file as a hive-partitioned dataset `region=.../dof_month=YYYY-MM/`.
+
+    Each partition gets one file per source content, `<filename>.<fingerprint>.parquet`,
+    so exporting the same content again replaces its files, while other files
+    of the same name sit next to them. Chunks are staged in hidden files first.
+    `commit()` then treats the whole file as `StagedLoad.promote` does: DEP/ARR
+    are joined over the whole file, the rows of a plan are merged into one
+    record by (sid, dof, region) and repeated rows without a SID are kept once.
+    Unlike the database, records are not merged with those of other files.
+    The merged files are renamed into place, and the content's files in
+    partitions it no longer has rows in are removed; `abort()` leaves the
+    previous export as it was.
+    """
+
+    def __init__(self, root: str, filename: str, fingerprint: str):
+        self.root = root
+        self.basename = f"{filename}.{fingerprint[:16]}.parquet"
+        # 2025 ARR messages are dated by the arrival, not the DOF.
+        self._next_day = filename.startswith("2025")
+        self._token = uuid.uuid4().hex
+        self._writers: Dict[Tuple[str, str], pq.ParquetWriter] = {}
+        self._rows = 0
+        self._messages: Dict[str, List[pd.DataFrame]] = {"dep": [], "arr": []}
+        self._plans: List[pd.DataFrame] = []
+
+    def _path(self, region: str, month: str) -> str:
+        return os.path.join(self.root, f"region={region}", f"dof_month={month}", self.basename)
+
+    def _temporary(self, path: str, kind: str = "tmp") -> str:
+        directory, name = os.path.split(path)
+        return os.path.join(directory, f".{name}.{self._token}.{kind}")
+
+    def _writer(self, region: str, month: str) -> pq.ParquetWriter:
+        key = (region, month)
+        if key not in self._writers:
+            path = self._path(region, month)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._writers[key] = pq.ParquetWriter(self._temporary(path, "stage"), _STAGE_SCHEMA, compression="zstd")
+        return self._writers[key]
+
+    def write(self, frame: pd.DataFrame):
+        if frame.empty:
+            return
+        frame = frame.assign(row_no=range(self._rows, self._rows + len(frame)))
+        self._rows += len(frame)
+        regions = frame["region"].map(_partition_value)
+        for key in ("dep", "arr"):
+            keyed = frame[f"{key}_msg_sid"].notna() & frame[f"{key}_msg_dof"].notna()
+            self._messages[key].append(pd.DataFrame({
+                "sid": frame[f"{key}_msg_sid"], "dof": frame[f"{key}_msg_dof"], "region": regions,
+                "time": frame[f"{key}_msg_time"],
+            })[keyed])
+        plans = frame["shr_col"].notna()
+        self._plans.append(pd.DataFrame({"sid": frame["sid"], "dof": frame["dof"], "region": regions})[plans])
+
+        months = frame["dof"].map(_month).map(_partition_value)
+        for (region, month), part in frame.groupby([regions, months], sort=False):
+            table = pa.Table.from_pandas(part, schema=_STAGE_SCHEMA, preserve_index=False)
+            self._writer(region, month).write_table(table)
+
+    def _merge(self, region: str, month: str, messages: Dict[Tuple[str, str], pd.Series]) -> str:
+        """Write the merged records of one staged partition; returns the file written."""
+        path = self._path(region, month)
+        frame = pq.read_table(self._temporary(path, "stage")).to_pandas()
+
+        def latest(key: str, dof: pd.Series) -> pd.Series:
+            found = messages.get((key, region))
+            if found is None:
+                return pd.Series(None, index=frame.index, dtype=object)
+            return pd.Series(found.reindex(pd.MultiIndex.from_arrays([frame["sid"], dof])).to_numpy(), index=frame.index)
+
+        has_plan = frame["shr_col"].notna()
+        times = {}
+        for key in ("dep", "arr"):
+            own = has_plan & frame[f"{key}_msg_sid"].eq(frame["sid"]) & frame[f"{key}_msg_dof"].eq(frame["dof"])
+            resolved = frame[f"{key}_msg_time"].where(own)
+            resolved = resolved.where(resolved.notna(), latest(key, frame["dof"]))
+            if key == "arr" and self._next_day:
+                next_day = (pd.to_datetime(frame["dof"]) + pd.Timedelta(days=1)).dt.date
+                resolved = resolved.where(resolved.notna(), latest(key, next_day))
+            times[key] = resolved.where(resolved.notna(), frame[f"{key}_time"])
+        frame["dep_time"], frame["arr_time"] = times["dep"], times["arr"]
+        frame["block_minutes"] = _block_minutes(frame["dep_time"], frame["arr_time"])
+
+        keyed = frame[frame["sid"].notna()]
+        group = keyed.groupby(["sid", "dof"], dropna=False, sort=False).ngroup()
+        latest = keyed[_MESSAGE_COLUMNS].groupby(group).last()
+        records = (keyed.assign(_group=group, _plan=keyed["shr_col"].notna())
+                   .sort_values(["_plan", "row_no"], kind="stable")
+                   .drop_duplicates("_group", keep="last")
+                   .set_index("_group"))
+        records[_MESSAGE_COLUMNS] = latest
+        # Rows without a SID are told apart by their DOF and messages, as in the database.
+        keyless = frame[frame["sid"].isna()].drop_duplicates(["dof", "shr_col", "dep_col", "arr_col"], keep="last")
+        merged = pd.concat([records.reset_index(drop=True), keyless]).sort_values("row_no")
+
+        merged_path = self._temporary(path)
+        table = pa.Table.from_pandas(merged, schema=PARQUET_SCHEMA, preserve_index=False)
+        pq.write_table(table, merged_path, compression="zstd")
+        os.remove(self._temporary(path, "stage"))
+        return path
+
+    def _unmatched(self) -> Dict[str, int]:
+        """DEP or ARR messages that name a plan no SHR of the file has."""
+        plans = pd.concat(self._plans)
+        plans = pd.MultiIndex.from_frame(plans[plans["sid"].notna() & plans["dof"].notna()])
+        unmatched = {}
+        for key in ("dep", "arr"):
+            messages = pd.concat(self._messages[key])
+            found = pd.MultiIndex.from_frame(messages[["sid", "dof", "region"]]).isin(plans)
+            if key == "arr" and self._next_day:
+                previous = (pd.to_datetime(messages["dof"]) - pd.Timedelta(days=1)).dt.date
+                found |= pd.MultiIndex.from_arrays([messages["sid"], previous, messages["region"]]).isin(plans)
+            unmatched[key] = int((~found).sum())
+        return unmatched
+
+    def commit(self, progress: Optional[IngestProgress] = None):
+        """Merge the staged partitions and put them in place of the content's previous export.
+
+        `progress.unmatched` is replaced by the count of messages whose plan is
+        not in the whole file, rather than their chunk.
+        """
+        started = time.perf_counter()
+        partitions = list(self._writers)
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+        # The latest message of each plan in the file, by kind and region.
+        messages = {}
+        for key, parts in self._messages.items():
+            if not parts:
+                continue
+            latest = pd.concat(parts).drop_duplicates(["sid", "dof", "region"], keep="last")
+            for region, part in latest.groupby("region", sort=False):
+                messages[key, region] = part.set_index(["sid", "dof"])["time"]
+        written = {self._merge(region, month, messages) for region, month in partitions}
+        if progress is not None and self._plans:
+            progress.unmatched = self._unmatched()
+        observe_stage(progress, "promote", self.basename, "", time.perf_counter() - started, self._rows)
+
+        os.makedirs(self.root, exist_ok=True)
+        # Exports of the same content, also from other workers, replace its
+        # files one after the other rather than interleaved.
+        with open(os.path.join(self.root, f".{self.basename}.lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            for path in written:
+                os.replace(self._temporary(path), path)
+            for path in glob.glob(os.path.join(glob.escape(self.root), "region=*", "dof_month=*", glob.escape(self.basename))):
+                if path not in written:
+                    os.remove(path)
+                    _remove_empty(os.path.dirname(path), self.root)
+
+    def abort(self):
+        for writer in self._writers.values():
+            writer.close()
+        for path in glob.glob(os.path.join(glob.escape(self.root), "region=*", "dof_month=*",
+                                           f".{glob.escape(self.basename)}.{self._token}.*")):
+            os.remove(path)
+        self._writers.clear()
+
+
+def _block_minutes(dep: pd.Series, arr: pd.Series) -> pd.Series:
+    """Minutes from `dep` to `arr`, past midnight if need be, as the database computes them."""
+    def seconds(times: pd.Series) -> pd.Series:
+        return pd.Series([None if t is None or t != t else t.hour * 3600 + t.minute * 60 + t.second for t in times],
+                         index=times.index, dtype="Int64")
+    minutes = (seconds(arr) - seconds(dep)) // 60 % 1440
+    return minutes.astype(object).where(minutes.notna(), None)
+
+
+def _remove_empty(directory: str, root: str):
+    while os.path.abspath(directory) != os.path.abspath(root):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            return
+        directory = os.path.dirname(directory)
+
+
+def _fingerprint(source: BinaryIO) -> str:
+    digest = hashlib.sha256()
+    source.seek(0)
+    while chunk := source.read(1024 * 1024):
+        digest.update(chunk)
+    source.seek(0)
+    return digest.hexdigest()
+
+def export_file(root: str, filename: str, source: BinaryIO, config: IngestConfig,
+                progress: Optional[IngestProgress] = None, fingerprint: Optional[str] = None,
+                pool: Optional[Executor] = None) -> Optional[str]:
+    """Parse a file like `parse_file` does, writing Parquet under `root` instead of the database.
+
+    The part files are named by `fingerprint`, the SHA-256 of the content,
+    which is computed here when not given.
+    """
+    progress = progress or IngestProgress()
+    try:
+        frames = iter_flight_frames(source, filename, config, progress, pool=pool)
+        if frames is None:
+            return UNSUPPORTED_FILE
+        dataset = ParquetDataset(root, filename, fingerprint or _fingerprint(source))
+        try:
+            for sheet, frame in frames:
+                started = time.perf_counter()
+                dataset.write(frame)
+                observe_stage(progress, "load", filename, sheet, time.perf_counter() - started, len(frame))
+                progress.add_rows(len(frame))
+            dataset.commit(progress)
+        except BaseException:
+            dataset.abort()
+            raise
+        return None
+    except Exception as e:
+        return f"Processing failed: {str(e)}"
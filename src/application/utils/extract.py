@@ -0,0 +1,270 @@
+from datetime import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from application.utils.columns import FLIGHT_COLUMNS, MESSAGE_KEY_COLUMNS
+from application.utils.geo import GRID_COLUMNS, GRID_DEGREES, decode_point, decode_zone
+from application.utils.tokenizer import shr_fields
+
+
+SHR_FIELDS = ["sid", "reg", "dep", "dest", "dof", "eet", "typ", "zona"]
+
+_MESSAGE = r"([\s\S]*)\(([\s\S]*)\)"
+
+_TIMES = {f"{h:02d}{m:02d}": time(h, m) for h in range(24) for m in range(60)}
+_MINUTES = {f"{h:02d}{m:02d}": h * 60 + m for h in range(24) for m in range(60)}
+
+_ATD = r"-ATD\s*(\d{4})"
+_ATA = r"-ATA\s*(\d{4})"
+_DEP_ZZZZ = r"DEP-[\s\S]*-ZZZZ(\d{4})"
+_ARR_ZZZZ = r"ARR-[\s\S]*-[\s\S]*-ZZZZ(\d{4})"
+# The flight plan a DEP/ARR message belongs to: (2025 layout, 2024 layout).
+_MESSAGE_SID = (r"-SID\s*(\d+)", r"SID/(\d+)")
+_DEP_DOF = (r"-ADD\s*(\d{6})", r"DOF/(\d{6})")
+_ARR_DOF = (r"-ADA\s*(\d{6})", r"DOF/(\d{6})")
+
+# Each group of columns is overwritten together when its mask is set and
+# otherwise carries over from the last row that set it. Departure and arrival
+# times are not carried; `correlate` joins them to their plan instead.
+_CARRY_GROUPS: List[Tuple[str, List[str]]] = [
+    ("shr_msg", ["f1"]),
+    ("shr_fields", SHR_FIELDS),
+    ("dep_msg", ["f2"]),
+    ("arr_msg", ["f3"]),
+]
+
+
+def _to_dates(values: pd.Series) -> pd.Series:
+    """DOF (YYMMDD) strings to dates; each distinct value is converted once."""
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_datetime(uniques, format="%y%m%d", errors="coerce")
+    lookup = [None if pd.isna(d) else d.date() for d in parsed] + [None]
+    return pd.Series(np.array(lookup, dtype=object)[codes], index=values.index, dtype=object)
+
+def _shift_days(values: pd.Series, days: int) -> pd.Series:
+    """DOF (YYMMDD) strings moved by `days`; each distinct value is converted once."""
+    codes, uniques = pd.factorize(values)
+    shifted = (pd.to_datetime(uniques, format="%y%m%d", errors="coerce") + pd.Timedelta(days=days)).strftime("%y%m%d")
+    lookup = [None if pd.isna(d) else d for d in shifted] + [None]
+    return pd.Series(np.array(lookup, dtype=object)[codes], index=values.index, dtype=object)
+
+def _to_times(values: pd.Series) -> pd.Series:
+    """HHMM strings to times through a lookup table of all 1440 valid values."""
+    return _nullable(values.map(_TIMES))
+
+def _text(column: pd.Series) -> pd.Series:
+    return column.dropna().astype(str)
+
+def _nullable(values: pd.Series) -> pd.Series:
+    return values.astype(object).where(values.notna(), None)
+
+def _clean(values: pd.Series) -> pd.Series:
+    text = values.astype(object).where(values.isna(), values.astype(str))
+    return _nullable(text.str.strip().str.rstrip(")/"))
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    if name in df.columns:
+        return df[name]
+    return pd.Series(None, index=df.index, dtype=object)
+
+def _split_message(column: pd.Series) -> pd.DataFrame:
+    parts = _text(column).str.extract(_MESSAGE)
+    return parts.dropna(subset=[0])
+
+def _extract(text: pd.Series, pattern: str, index: pd.Index) -> pd.Series:
+    return text.str.extract(pattern)[0].reindex(index)
+
+def tokenize_shr(shr_in: pd.Series) -> pd.DataFrame:
+    """SHR fields of a column of message bodies; each distinct body is scanned once."""
+    codes, messages = pd.factorize(shr_in)
+    fields = pd.DataFrame([shr_fields(m) for m in messages], columns=SHR_FIELDS, dtype=object)
+    return fields.reindex(codes).set_axis(shr_in.index)
+
+def extract_columns(df: pd.DataFrame, is_2025: bool) -> pd.DataFrame:
+    """Per-row field extraction, independent of neighbouring rows.
+
+    Every message field comes with a boolean mask column telling whether the
+    row sets it; rows that do not set a field inherit it in `carry_forward`.
+    """
+    index = df.index
+    out = pd.DataFrame(index=index)
+
+    shr = _split_message(_column(df, "SHR"))
+    shr_in = shr[1][shr[1] != ""]
+    out["shr_msg"] = index.isin(shr.index)
+    out["f1"] = shr[0].reindex(index)
+    out["shr_fields"] = index.isin(shr_in.index)
+    fields = tokenize_shr(shr_in)
+    for field in SHR_FIELDS:
+        out[field] = fields[field].reindex(index)
+
+    for key, pattern_2025, pattern_2024, out_col, dof_patterns in (
+        ("dep", _ATD, _DEP_ZZZZ, "f2", _DEP_DOF),
+        ("arr", _ATA, _ARR_ZZZZ, "f3", _ARR_DOF),
+    ):
+        text = _text(_column(df, key.upper()))
+        if is_2025:
+            out[f"{key}_msg"] = False
+            out[out_col] = None
+            out[f"{key}_time"] = _extract(text, pattern_2025, index)
+            body = text
+        else:
+            message = _split_message(text)
+            message_in = message[1][message[1] != ""]
+            out[f"{key}_msg"] = index.isin(message.index)
+            out[out_col] = message[0].reindex(index)
+            out[f"{key}_time"] = _extract(message_in, pattern_2024, index)
+            body = message_in
+        out[f"{key}_sid"] = _extract(body, _MESSAGE_SID[not is_2025], index)
+        out[f"{key}_dof"] = _extract(body, dof_patterns[not is_2025], index)
+
+    return out
+
+def carry_forward(columns: pd.DataFrame, state: Optional[Dict[str, object]] = None) -> Dict[str, np.ndarray]:
+    """Resolve carried-over fields; `state` holds the values left by the previous chunk.
+
+    When given, `state` is updated in place with the values carried out of this chunk.
+    """
+    state = {} if state is None else state
+    positions = np.arange(len(columns))
+    resolved = {}
+    for mask, names in _CARRY_GROUPS:
+        source = np.where(columns[mask].to_numpy(bool), positions, -1)
+        source = np.maximum.accumulate(source) if len(source) else source
+        known = source >= 0
+        for name in names:
+            values = _nullable(columns[name]).to_numpy(object)
+            resolved[name] = np.where(known, values[np.maximum(source, 0)], state.get(name))
+            if len(values):
+                state[name] = resolved[name][-1]
+    return resolved
+
+def message_keys(sid: pd.Series, dof: pd.Series, message_sid: pd.Series, message_dof: pd.Series,
+                 times: pd.Series, own_dof: bool = False) -> pd.DataFrame:
+    """SID, DOF and time of the DEP or ARR messages that name a plan.
+
+    A message names its plan by its own SID and DOF, falling back to the row's
+    for whichever it lacks. With `own_dof` a message naming the row's SID is
+    keyed by the row's DOF instead of its own date: 2025 messages are dated
+    by the event (-ADD, -ADA), which for a flight past midnight is not its DOF.
+    """
+    message_sid = _clean(message_sid).fillna(sid)
+    message_dof = _clean(message_dof)
+    if own_dof:
+        message_dof = message_dof.mask(message_sid.eq(sid) & dof.notna(), dof)
+    messages = pd.DataFrame({"sid": message_sid, "dof": message_dof.fillna(dof), "time": times})
+    return messages[messages["time"].notna()].dropna(subset=["sid", "dof"])
+
+def correlate(sid: pd.Series, dof: pd.Series, is_plan: np.ndarray, keyed: pd.DataFrame,
+              times: pd.Series, next_day: bool = False) -> Tuple[pd.Series, int]:
+    """Time of the DEP or ARR message for each row's flight plan, by a hash join on SID + DOF.
+
+    `keyed` are the rows' messages as given by `message_keys`. A plan keeps
+    the message on its own row when that names it; otherwise the last message
+    for the plan wins. With `next_day`, a plan without one takes a message
+    dated the day after its DOF, as an overnight 2025 ARR is. Rows whose own
+    message names no plan at all keep its time. Also returns how many
+    messages name a plan that no SHR of the chunk has.
+    """
+    keys = pd.DataFrame({"sid": sid, "dof": dof})
+    index = keyed.drop_duplicates(["sid", "dof"], keep="last")
+
+    joined = keys.merge(index, on=["sid", "dof"], how="left")["time"].set_axis(keys.index)
+    if next_day:
+        following = pd.DataFrame({"sid": sid, "dof": _shift_days(dof, 1)})
+        later = following.merge(index, on=["sid", "dof"], how="left")["time"].set_axis(keys.index)
+        joined = joined.where(joined.notna(), later)
+    own_key = keyed.reindex(keys.index)
+    own = is_plan & own_key["sid"].eq(sid).to_numpy() & own_key["dof"].eq(dof).to_numpy()
+    keyless = times.where(~times.index.isin(keyed.index))
+    resolved = times.where(own, joined.where(joined.notna(), keyless))
+
+    plans = pd.MultiIndex.from_frame(keys[is_plan].dropna())
+    matched = pd.MultiIndex.from_frame(keyed[["sid", "dof"]]).isin(plans)
+    if next_day:
+        matched |= pd.MultiIndex.from_arrays([keyed["sid"], _shift_days(keyed["dof"], -1)]).isin(plans)
+    return resolved, int((~matched).sum())
+
+def _grid_cells(lat: pd.Series, lon: pd.Series) -> pd.Series:
+    row = np.floor((lat + 90) / GRID_DEGREES)
+    column = np.minimum(np.floor((lon + 180) / GRID_DEGREES), GRID_COLUMNS - 1)
+    return _nullable((row * GRID_COLUMNS + column).astype("Int64"))
+
+def _decode(values: pd.Series, decoder, width: int) -> np.ndarray:
+    """`decoder` applied to each distinct value once, as a float array with NaN for None."""
+    codes, uniques = pd.factorize(values)
+    decoded = [decoder(v) or (None,) * width for v in uniques] + [(None,) * width]
+    return np.array(decoded, dtype=float).reshape(-1, width)[codes]
+
+def _geometry(dep: pd.Series, dest: pd.Series, zona: pd.Series) -> Dict[str, pd.Series]:
+    """GEO_COLUMNS from DEP/, DEST/ and ZONA values."""
+    index = dep.index
+    columns = {}
+    for name, values in (("dep", dep), ("dest", dest)):
+        lat_lon = _decode(values, decode_point, 2)
+        columns[f"{name}_lat"] = pd.Series(lat_lon[:, 0], index=index)
+        columns[f"{name}_lon"] = pd.Series(lat_lon[:, 1], index=index)
+    zone = _decode(zona, decode_zone, 3)
+    for i, column in enumerate(("zona_lat", "zona_lon", "zona_radius_km")):
+        columns[column] = pd.Series(zone[:, i], index=index)
+    cells = {f"{name}_cell": _grid_cells(columns[f"{name}_lat"], columns[f"{name}_lon"])
+             for name in ("dep", "dest", "zona")}
+    return {column: _nullable(values) for column, values in columns.items()} | cells
+
+def _block_minutes(dep_time: pd.Series, arr_time: pd.Series) -> pd.Series:
+    """Minutes from departure to arrival; an arrival before the departure is on the next day."""
+    minutes = (arr_time.map(_MINUTES) - dep_time.map(_MINUTES)) % 1440
+    return _nullable(minutes.astype("Int64"))
+
+def extract_flights(df: pd.DataFrame, filename: str, region: Optional[str] = None,
+                    is_2025: bool = False, state: Optional[Dict[str, object]] = None,
+                    columns: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Column-wise equivalent of the former per-row `iterrows` parser.
+
+    `region` is used for every row unless the sheet is in the 2025 layout,
+    where it comes from the `Центр ЕС ОрВД` column. Pass the same `state` dict
+    for consecutive chunks of one sheet to carry values across chunk boundaries.
+    `columns` is the result of `extract_columns(df)` when it was computed elsewhere.
+    """
+    index = df.index
+    if columns is None:
+        columns = extract_columns(df, is_2025)
+    values = carry_forward(columns, state)
+
+    frame = pd.DataFrame(index=index)
+    for raw, column in (("SHR", "shr_col"), ("DEP", "dep_col"), ("ARR", "arr_col")):
+        frame[column] = _nullable(_column(df, raw))
+    for column in ("f1", "f2", "f3", "sid", "reg", "dep", "dest", "eet", "zona", "typ"):
+        frame[column] = _clean(pd.Series(values[column], index=index, dtype=object))
+    frame["dof"] = _to_dates(pd.Series(values["dof"], index=index, dtype=object))
+
+    # DEP/ARR are matched to plans within the chunk, so they no longer take
+    # the times of whatever message came before them. Each row also keeps its
+    # own message's key, for loaders that match over the whole file.
+    dof = _clean(pd.Series(values["dof"], index=index, dtype=object))
+    is_plan = columns["shr_fields"].to_numpy(bool)
+    times, unmatched = {}, {}
+    for key in ("dep", "arr"):
+        keyed = message_keys(frame["sid"], dof, columns[f"{key}_sid"], columns[f"{key}_dof"],
+                             columns[f"{key}_time"], own_dof=is_2025)
+        times[key], unmatched[key] = correlate(frame["sid"], dof, is_plan, keyed, columns[f"{key}_time"],
+                                               next_day=is_2025 and key == "arr")
+        frame[f"{key}_time"] = _to_times(times[key])
+        keyed = keyed.reindex(index)
+        frame[f"{key}_msg_sid"] = _nullable(keyed["sid"])
+        frame[f"{key}_msg_dof"] = _to_dates(keyed["dof"])
+        frame[f"{key}_msg_time"] = _to_times(keyed["time"])
+    frame["block_minutes"] = _block_minutes(times["dep"], times["arr"])
+    for column, values in _geometry(frame["dep"], frame["dest"], frame["zona"]).items():
+        frame[column] = values
+    if is_2025:
+        frame["region"] = _clean(_column(df, "Центр ЕС ОрВД"))
+    else:
+        frame["region"] = _clean(pd.Series(region, index=index, dtype=object))
+    frame["file"] = filename
+
+    frame = frame[FLIGHT_COLUMNS + MESSAGE_KEY_COLUMNS].reset_index(drop=True)
+    frame.attrs["unmatched"] = unmatched
+    return frame
@@ -0,0 +1,210 @@
+import re
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from application.utils.geo import EARTH_RADIUS_KM, MAX_AREA_CELLS, Area, area_cells
+from application.utils.tokenizer import tokenize
+
+
+FLIGHT_FIELDS = [
+    "id", "sid", "reg", "dep", "dest", "eet", "zona", "typ",
+    "dof", "dep_time", "arr_time", "block_minutes",
+    "dep_lat", "dep_lon", "dest_lat", "dest_lon", "zona_lat", "zona_lon", "zona_radius_km",
+    "region", "file",
+]
+FILTER_COLUMNS = ["region", "dep", "dest", "typ", "reg"]
+# What of a flight an area search matches: its departure or destination point
+# or its ZONA.
+AREA_MATCHES = ("dep", "dest", "zona")
+ROLLUP_GROUPS = ["region", "dof", "typ", "dep_hour"]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class FlightFilter:
+    region: Optional[str] = None
+    dep: Optional[str] = None
+    dest: Optional[str] = None
+    typ: Optional[str] = None
+    reg: Optional[str] = None
+    dof_from: Optional[date] = None
+    dof_to: Optional[date] = None
+    area: Optional[Area] = None
+    area_match: Tuple[str, ...] = AREA_MATCHES
+
+    @property
+    def has_dof_range(self) -> bool:
+        return self.dof_from is not None or self.dof_to is not None
+
+
+@dataclass
+class Cursor:
+    """Position after the last row of a page: its `dof` (empty when NULL) and `id`."""
+    dof: Optional[date]
+    id: int
+
+    def encode(self) -> str:
+        return f"{self.dof.isoformat() if self.dof else ''}:{self.id}"
+
+    @classmethod
+    def decode(cls, value: str) -> "Cursor":
+        dof, sep, id_ = value.partition(":")
+        try:
+            if not sep:
+                raise ValueError(value)
+            return cls(date.fromisoformat(dof) if dof else None, int(id_))
+        except ValueError:
+            raise InvalidCursor(f"invalid cursor: {value}")
+
+
+def _where(filters: FlightFilter) -> Tuple[List[str], Dict[str, object]]:
+    clauses, params = [], {}
+    for name in FILTER_COLUMNS:
+        value = getattr(filters, name)
+        if value is not None:
+            clauses.append(f"{name} = :{name}")
+            params[name] = value
+    if filters.dof_from is not None:
+        clauses.append("dof >= :dof_from")
+        params["dof_from"] = filters.dof_from
+    if filters.dof_to is not None:
+        clauses.append("dof <= :dof_to")
+        params["dof_to"] = filters.dof_to
+    if filters.area is not None:
+        clauses.append(_area_clause(filters.area, filters.area_match, params))
+    return clauses, params
+
+def _distance_km(lat1: str, lon1: str, lat2: str, lon2: str) -> str:
+    """Haversine distance between two points given as SQL expressions."""
+    return (
+        f"2 * {EARTH_RADIUS_KM} * asin(least(1, sqrt("
+        f"power(sin(radians({lat2} - {lat1}) / 2), 2) + "
+        f"cos(radians({lat1})) * cos(radians({lat2})) * power(sin(radians({lon2} - {lon1}) / 2), 2))))"
+    )
+
+def _cells_clause(column: str, area: Area, params: Dict[str, object], name: str) -> str:
+    """Candidate rows by grid cell, one index scan per cell or per range of cells."""
+    ranges = area_cells(area)
+    if sum(last - first + 1 for first, last in ranges) <= MAX_AREA_CELLS:
+        params[name] = [cell for first, last in ranges for cell in range(first, last + 1)]
+        return f"{column} = ANY(:{name})"
+    params[f"{name}_first"], params[f"{name}_last"] = ranges[0][0], ranges[-1][1]
+    return f"{column} BETWEEN :{name}_first AND :{name}_last"
+
+def _area_clause(area: Area, match: Tuple[str, ...], params: Dict[str, object]) -> str:
+    """Flights with a point in the area or a ZONA reaching into it.
+
+    The grid cell indexes, or for zones the index of their bounding boxes,
+    narrow the search, then the exact box or circle is checked on the
+    coordinates of the candidates.
+    """
+    params.update(min_lat=area.min_lat, min_lon=area.min_lon, max_lat=area.max_lat, max_lon=area.max_lon)
+    if area.center is not None:
+        params.update(lat=area.center[0], lon=area.center[1], radius_km=area.radius_km)
+
+    alternatives = []
+    for kind in match:
+        lat, lon = f"{kind}_lat", f"{kind}_lon"
+        if kind == "zona":
+            cells = "zona_box && box(point(:min_lon, :min_lat), point(:max_lon, :max_lat))"
+            if area.center is not None:
+                exact = f"{_distance_km(lat, lon, ':lat', ':lon')} <= :radius_km + zona_radius_km"
+            else:
+                # Distance from the zone's centre to the nearest point of the box.
+                nearest_lat = f"greatest(:min_lat, least(:max_lat, {lat}))"
+                nearest_lon = f"greatest(:min_lon, least(:max_lon, {lon}))"
+                exact = f"{_distance_km(lat, lon, nearest_lat, nearest_lon)} <= zona_radius_km"
+        else:
+            cells = _cells_clause(f"{kind}_cell", area, params, "area_cells")
+            exact = f"{lat} BETWEEN :min_lat AND :max_lat AND {lon} BETWEEN :min_lon AND :max_lon"
+            if area.center is not None:
+                exact += f" AND {_distance_km(lat, lon, ':lat', ':lon')} <= :radius_km"
+        alternatives.append(f"({cells} AND {exact})")
+    return f"({' OR '.join(alternatives)})"
+
+def _fetch(conn, clauses: List[str], params: Dict[str, object], order: str, limit: int) -> List[Dict]:
+    sql = (
+        f"SELECT {', '.join(FLIGHT_FIELDS)} FROM flights "
+        f"WHERE {' AND '.join(clauses)} ORDER BY {order} LIMIT :limit"
+    )
+    rows = conn.execute(text(sql), {**params, "limit": limit})
+    return [dict(row._mapping) for row in rows]
+
+def query_flights(engine: Engine, filters: FlightFilter, limit: int,
+                  after: Optional[Cursor] = None) -> Tuple[List[Dict], Optional[Cursor]]:
+    """One page of flights ordered by (dof, id), rows without a DOF last.
+
+    Pages are located by keyset instead of OFFSET, so each page is a range scan
+    of one of the (<filter>, dof, id) indexes. Dated and undated rows are read
+    by separate queries to keep both orders index-backed.
+    """
+    clauses, params = _where(filters)
+    rows = []
+    with engine.connect() as conn:
+        if after is None or after.dof is not None:
+            dated = clauses + ["dof IS NOT NULL"]
+            if after is not None:
+                dated.append("(dof, id) > (:after_dof, :after_id)")
+                params.update(after_dof=after.dof, after_id=after.id)
+            rows = _fetch(conn, dated, params, "dof, id", limit + 1)
+        if len(rows) <= limit and not filters.has_dof_range:
+            undated = clauses + ["dof IS NULL"]
+            if after is not None and after.dof is None:
+                undated.append("id > :after_id")
+                params.update(after_id=after.id)
+            rows += _fetch(conn, undated, params, "id", limit + 1 - len(rows))
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, Cursor(rows[-1]["dof"], rows[-1]["id"])
+
+def _items(message: Optional[str]) -> Optional[Dict[str, str]]:
+    if message is None:
+        return None
+    body = re.search(r"\(([\s\S]*)\)", message)
+    return tokenize(body.group(1) if body else message)
+
+def get_flight(engine: Engine, flight_id: int) -> Optional[Dict]:
+    """One flight with its raw SHR, DEP and ARR messages, and all field 18
+    items of the SHR as `shr_items`."""
+    sql = f"""
+        SELECT {', '.join(f'f.{name}' for name in FLIGHT_FIELDS)},
+               shr.body AS shr_col, dep.body AS dep_col, arr.body AS arr_col
+        FROM flights f
+        LEFT JOIN raw_messages shr ON shr.hash = f.shr_hash
+        LEFT JOIN raw_messages dep ON dep.hash = f.dep_hash
+        LEFT JOIN raw_messages arr ON arr.hash = f.arr_hash
+        WHERE f.id = :id
+    """
+    with engine.connect() as conn:
+        row = conn.execute(text(sql), {"id": flight_id}).first()
+    if row is None:
+        return None
+    found = dict(row._mapping)
+    found["shr_items"] = _items(found["shr_col"])
+    return found
+
+def query_daily(engine: Engine, group_by: List[str], filters: FlightFilter) -> List[Dict]:
+    """Flight counts from the `flights_daily` rollup, grouped by any of ROLLUP_GROUPS.
+
+    Only the region, typ and DOF range filters apply; the rollup has no other columns.
+    """
+    clauses, params = _where(FlightFilter(region=filters.region, typ=filters.typ,
+                                          dof_from=filters.dof_from, dof_to=filters.dof_to))
+    columns = [name for name in ROLLUP_GROUPS if name in group_by]
+    select = ", ".join(columns + ["sum(flights)::bigint AS flights"])
+    sql = f"SELECT {select} FROM flights_daily"
+    if clauses:
+        sql += f" WHERE {' AND '.join(clauses)}"
+    if columns:
+        sql += f" GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}"
+    with engine.connect() as conn:
+        return [dict(row._mapping) for row in conn.execute(text(sql), params)]
@@ -0,0 +1,125 @@
+import math
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+
+# Flights are indexed by the cell of a fixed grid their points fall in; zones,
+# which can be any size, by their bounding box instead. Cells are numbered row
+# by row from the south-west corner, so the cells of one grid row within a
+# longitude range are consecutive ids.
+GRID_DEGREES = 0.1
+GRID_COLUMNS = round(360 / GRID_DEGREES)
+# Above this many cells an area is searched by the range from its first to its
+# last cell instead; the exact bounds are checked either way.
+MAX_AREA_CELLS = 2048
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Columns `extract_flights` fills from the decoded values.
+GEO_COLUMNS = [
+    "dep_lat", "dep_lon", "dest_lat", "dest_lon",
+    "zona_lat", "zona_lon", "zona_radius_km",
+    "dep_cell", "dest_cell", "zona_cell",
+]
+
+# `5957N02905E` or `595730N0290512E`: degrees, minutes and optional seconds.
+_COORD = re.compile(r"(\d{2})(\d{2})(\d{2})?([NS])\s?(\d{3})(\d{2})(\d{2})?([EW])")
+_RADIUS = re.compile(r"(?:^|\s)R\s?(\d+(?:[.,]\d+)?)")
+
+Point = Tuple[float, float]
+
+
+class InvalidArea(ValueError):
+    pass
+
+
+def _check_point(lat: float, lon: float):
+    if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        raise InvalidArea(f"invalid coordinates: {lat}, {lon}")
+
+
+@dataclass
+class Area:
+    """A bounding box, optionally narrowed to the circle it was derived from.
+
+    Boxes do not cross the antimeridian: `min_lon` is west of `max_lon`.
+    """
+    min_lat: float
+    min_lon: float
+    max_lat: float
+    max_lon: float
+    center: Optional[Point] = None
+    radius_km: Optional[float] = None
+
+    @classmethod
+    def box(cls, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> "Area":
+        _check_point(min_lat, min_lon)
+        _check_point(max_lat, max_lon)
+        if min_lat > max_lat or min_lon > max_lon:
+            raise InvalidArea("min_lat/min_lon must not exceed max_lat/max_lon")
+        return cls(min_lat, min_lon, max_lat, max_lon)
+
+    @classmethod
+    def circle(cls, lat: float, lon: float, radius_km: float) -> "Area":
+        _check_point(lat, lon)
+        if radius_km <= 0:
+            raise InvalidArea("radius_km must be positive")
+        d_lat = radius_km / KM_PER_DEGREE
+        d_lon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        return cls(max(lat - d_lat, -90.0), max(lon - d_lon, -180.0),
+                   min(lat + d_lat, 90.0), min(lon + d_lon, 180.0), (lat, lon), radius_km)
+
+
+def _coordinate(match: re.Match) -> Optional[Point]:
+    lat_d, lat_m, lat_s, ns, lon_d, lon_m, lon_s, ew = match.groups()
+    if int(lat_m) >= 60 or int(lon_m) >= 60 or int(lat_s or 0) >= 60 or int(lon_s or 0) >= 60:
+        return None
+    lat = int(lat_d) + int(lat_m) / 60 + int(lat_s or 0) / 3600
+    lon = int(lon_d) + int(lon_m) / 60 + int(lon_s or 0) / 3600
+    if lat > 90 or lon > 180:
+        return None
+    return (-lat if ns == "S" else lat, -lon if ew == "W" else lon)
+
+def decode_point(value: Optional[str]) -> Optional[Point]:
+    """Latitude and longitude of a DEP/ or DEST/ value that is a coordinate."""
+    if not value:
+        return None
+    match = _COORD.fullmatch(value.strip())
+    return _coordinate(match) if match else None
+
+def distance_km(a: Point, b: Point) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+def decode_zone(value: Optional[str]) -> Optional[Tuple[float, float, float]]:
+    """A ZONA as a circle (lat, lon, radius in km).
+
+    `R<km> <point>` is a circle; several points are a polygon, stored as the
+    circle around its bounding box. Zones without coordinates give None.
+    """
+    if not value:
+        return None
+    points = [p for p in map(_coordinate, _COORD.finditer(value)) if p is not None]
+    if not points:
+        return None
+    radius = _RADIUS.search(value)
+    radius_km = float(radius.group(1).replace(",", ".")) if radius else 0.0
+    if len(points) == 1:
+        return points[0][0], points[0][1], radius_km
+    lats, lons = zip(*points)
+    center = ((min(lats) + max(lats)) / 2, (min(lons) + max(lons)) / 2)
+    return center[0], center[1], max(distance_km(center, p) for p in points) + radius_km
+
+def grid_cell(lat: float, lon: float) -> int:
+    row = math.floor((lat + 90) / GRID_DEGREES)
+    column = min(math.floor((lon + 180) / GRID_DEGREES), GRID_COLUMNS - 1)
+    return row * GRID_COLUMNS + column
+
+def area_cells(area: Area) -> List[Tuple[int, int]]:
+    """The area's grid cells as one (first, last) id range per grid row."""
+    first, last = grid_cell(area.min_lat, area.min_lon), grid_cell(area.max_lat, area.max_lon)
+    width = last % GRID_COLUMNS - first % GRID_COLUMNS
+    return [(row, row + width) for row in range(first, last + 1, GRID_COLUMNS)]
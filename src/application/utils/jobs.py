@@ -0,0 +1,284 @@
+import json
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from application.utils.metrics import JOB_SECONDS, JOBS
+from application.utils.progress import IngestProgress
+
+
+logger = logging.getLogger(__name__)
+
+
+class JobState(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    filename: str
+    state: JobState = JobState.QUEUED
+    error: Optional[str] = None
+    progress: IngestProgress = field(default_factory=IngestProgress)
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (JobState.DONE, JobState.FAILED)
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        progress = self.progress
+        run_seconds = end - self.started_at if self.started_at else None
+        # Rows read before a resume took no time in this run.
+        rows_per_s = (progress.rows_read - progress.resumed_rows) / run_seconds if run_seconds else None
+        eta_seconds = None
+        if rows_per_s and progress.rows_total is not None and not self.finished:
+            eta_seconds = max(progress.rows_total - progress.rows_read, 0) / rows_per_s
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "state": self.state.value,
+            "sheet": progress.sheet,
+            "rows_read": progress.rows_read,
+            "rows_total": progress.rows_total,
+            "rows_written": self.progress.rows_written,
+            "resumed_rows": self.progress.resumed_rows,
+            "skipped": self.progress.skipped,
+            "stage_seconds": dict(self.progress.stage_seconds),
+            "unmatched": dict(self.progress.unmatched),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queued_seconds": (self.started_at or end) - self.created_at,
+            "run_seconds": run_seconds,
+            "rows_per_s": rows_per_s,
+            "eta_seconds": eta_seconds,
+        }
+
+
+@dataclass
+class JobSnapshot:
+    """Status of a job run by another server worker, as last published."""
+    status: Dict
+
+    @property
+    def finished(self) -> bool:
+        return self.status["state"] in (JobState.DONE.value, JobState.FAILED.value)
+
+    def to_dict(self) -> dict:
+        return self.status
+
+
+_SAVE_JOBS_SQL = """
+INSERT INTO ingest_jobs (id, status, finished)
+VALUES (:id, CAST(:status AS JSONB), :finished)
+ON CONFLICT (id) DO UPDATE SET status = EXCLUDED.status, finished = EXCLUDED.finished, updated_at = now()
+"""
+_PRUNE_JOBS_SQL = """
+DELETE FROM ingest_jobs
+WHERE id IN (SELECT id FROM ingest_jobs WHERE finished ORDER BY updated_at DESC OFFSET :retain)
+"""
+
+
+class JobStore:
+    """Job status in the `ingest_jobs` table, so that each server worker can
+    answer for the jobs of the others."""
+
+    def __init__(self, engine: Engine, retain: int):
+        self._engine = engine
+        self._retain = retain
+
+    def save(self, jobs: List[Job]):
+        rows = [{"id": job.id, "status": json.dumps(job.to_dict(), ensure_ascii=False), "finished": job.finished}
+                for job in jobs]
+        with self._engine.begin() as conn:
+            conn.execute(text(_SAVE_JOBS_SQL), rows)
+            if any(job.finished for job in jobs):
+                conn.execute(text(_PRUNE_JOBS_SQL), {"retain": self._retain})
+
+    def load(self, job_id: str) -> Optional[JobSnapshot]:
+        with self._engine.connect() as conn:
+            status = conn.execute(text("SELECT status FROM ingest_jobs WHERE id = :id"), {"id": job_id}).scalar()
+        return JobSnapshot(status) if status is not None else None
+
+
+class JobManager:
+    """Runs ingest jobs on a bounded thread pool and keeps their status.
+
+    With a `store`, a background thread publishes each job when it is queued,
+    started or finished, and running jobs every `publish_interval` seconds.
+    With `parse_processes` > 1, `parse_pool` is a process pool the jobs share
+    to parse workbook sheets on; its processes start with the first workbook.
+    """
+
+    def __init__(self, workers: int, queue_limit: int, retain: int,
+                 store: Optional[JobStore] = None, publish_interval: float = 1.0, parse_processes: int = 1):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        # Spawned rather than forked: this process runs threads.
+        self.parse_pool = None
+        if parse_processes > 1:
+            self.parse_pool = ProcessPoolExecutor(max_workers=parse_processes,
+                                                  mp_context=multiprocessing.get_context("spawn"))
+        self._queue_limit = queue_limit
+        self._retain = retain
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        # Jobs not started yet, with what releases their input if they never are.
+        self._waiting: Dict[str, Tuple[Future, Optional[Callable[[], None]]]] = {}
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._store = store
+        self._publish_interval = publish_interval
+        self._unpublished: List[Job] = []
+        self._wake = threading.Event()
+        self._closed = False
+        self._publisher = None
+        if store is not None:
+            self._publisher = threading.Thread(target=self._publish_loop, name="job-publisher", daemon=True)
+            self._publisher.start()
+
+    def submit(self, filename: str, task: Callable[[Job], Optional[str]],
+               release: Optional[Callable[[], None]] = None) -> Job:
+        """Queue `task`, which returns an error message or None on success.
+
+        `release` frees what the task would have consumed, e.g. its spooled
+        upload, and is called instead of it when the job is cancelled by
+        `shutdown()` before it starts.
+        """
+        with self._lock:
+            if self._queued >= self._queue_limit:
+                raise QueueFull(f"{self._queued} jobs already waiting")
+            self._queued += 1
+            job = Job(id=uuid.uuid4().hex, filename=filename)
+            self._jobs[job.id] = job
+            self._prune()
+            # Under the lock, so _run finds the entry to remove.
+            self._waiting[job.id] = (self._executor.submit(self._run, job, task), release)
+        self._publish(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Union[Job, JobSnapshot]]:
+        """A job of this process, or else the last published status of another's.
+
+        Reads the store for jobs this process does not have; do not call it
+        on the event loop.
+        """
+        job = self._jobs.get(job_id)
+        if job is None and self._store is not None:
+            return self._store.load(job_id)
+        return job
+
+    def shutdown(self):
+        """Stop taking jobs; the ones still queued fail and their input is released."""
+        with self._lock:
+            waiting = list(self._waiting.items())
+        cancelled = 0
+        for job_id, (future, release) in waiting:
+            if not future.cancel():
+                continue
+            job = self._jobs[job_id]
+            job.error = "Server shut down before the job started"
+            job.finished_at = time.time()
+            job.state = JobState.FAILED
+            with self._lock:
+                self._queued -= 1
+                del self._waiting[job_id]
+            if release is not None:
+                release()
+            JOBS.labels(job.state.value).inc()
+            self._publish(job)
+            cancelled += 1
+        if cancelled:
+            logger.warning("%d queued ingest jobs failed at shutdown", cancelled)
+        self._executor.shutdown(wait=False)
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown(wait=False, cancel_futures=True)
+        if self._publisher is not None:
+            self._closed = True
+            self._wake.set()
+            self._publisher.join()
+
+    def _publish(self, job: Job):
+        if self._store is None:
+            return
+        with self._lock:
+            self._unpublished.append(job)
+        self._wake.set()
+
+    def _publish_loop(self):
+        while True:
+            self._wake.wait(self._publish_interval)
+            self._wake.clear()
+            with self._lock:
+                jobs = {job.id: job for job in self._unpublished}
+                self._unpublished.clear()
+                jobs.update((job.id, job) for job in self._jobs.values() if job.state == JobState.RUNNING)
+            if jobs:
+                try:
+                    self._store.save(list(jobs.values()))
+                except Exception:
+                    logger.exception("could not publish ingest job status")
+            if self._closed:
+                return
+
+    def _run(self, job: Job, task: Callable[[Job], Optional[str]]):
+        with self._lock:
+            self._queued -= 1
+            del self._waiting[job.id]
+        job.started_at = time.time()
+        job.state = JobState.RUNNING
+        self._publish(job)
+        try:
+            job.error = task(job)
+        except Exception as e:
+            job.error = f"Processing failed: {e}"
+        job.finished_at = time.time()
+        job.state = JobState.FAILED if job.error else JobState.DONE
+        self._publish(job)
+        self._report(job)
+
+    @staticmethod
+    def _report(job: Job):
+        run_seconds = job.finished_at - job.started_at
+        JOBS.labels(job.state.value).inc()
+        JOB_SECONDS.observe(run_seconds)
+        logger.info(json.dumps({
+            "event": "ingest_job",
+            "job_id": job.id,
+            "filename": job.filename,
+            "state": job.state.value,
+            "error": job.error,
+            "rows": job.progress.rows_written,
+            "resumed_rows": job.progress.resumed_rows,
+            "skipped": job.progress.skipped,
+            "queued_seconds": round(job.started_at - job.created_at, 3),
+            "run_seconds": round(run_seconds, 3),
+            "stage_seconds": {k: round(v, 3) for k, v in job.progress.stage_seconds.items()},
+            "unmatched": job.progress.unmatched,
+        }, ensure_ascii=False))
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self._retain)]:
+            del self._jobs[job_id]
@@ -0,0 +1,57 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from application.utils.columns import DB_COLUMNS, FLIGHT_COLUMNS, RAW_COLUMNS
+
+
+def message_hash(body: str) -> bytes:
+    """Content address of a message; the same as `sha256(convert_to(body, 'UTF8'))` in SQL."""
+    return hashlib.sha256(body.encode("utf-8")).digest()
+
+
+class HashCache:
+    """Bounded, thread-safe set of hashes known to be stored in `raw_messages`."""
+
+    def __init__(self, size: int):
+        self._size = size
+        self._hashes: "OrderedDict[bytes, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def missing(self, hashes: Iterable[bytes]) -> List[bytes]:
+        with self._lock:
+            return [h for h in hashes if h not in self._hashes]
+
+    def add(self, hashes: Iterable[bytes]):
+        with self._lock:
+            for h in hashes:
+                self._hashes[h] = None
+                self._hashes.move_to_end(h)
+            while len(self._hashes) > self._size:
+                self._hashes.popitem(last=False)
+
+
+def _bytea(digest: bytes) -> str:
+    return "\\x" + digest.hex()
+
+def split_messages(batch: pd.DataFrame, cache: HashCache) -> Tuple[pd.DataFrame, pd.DataFrame, List[bytes]]:
+    """Replace the raw message columns of `batch` by their hashes.
+
+    Returns the batch with DB_COLUMNS, the (hash, body) rows not yet in `cache`
+    and their hashes. Each distinct body in the batch is hashed once.
+    """
+    rows = batch[FLIGHT_COLUMNS].rename(columns=RAW_COLUMNS)
+    bodies = {}
+    for raw, column in RAW_COLUMNS.items():
+        codes, uniques = pd.factorize(batch[raw])
+        digests = [message_hash(str(body)) for body in uniques]
+        bodies.update(zip(digests, map(str, uniques)))
+        rows[column] = np.array([_bytea(d) for d in digests] + [None], dtype=object)[codes]
+
+    new = cache.missing(bodies)
+    messages = pd.DataFrame({"hash": [_bytea(h) for h in new], "body": [bodies[h] for h in new]})
+    return rows[DB_COLUMNS], messages, new
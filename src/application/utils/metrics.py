@@ -0,0 +1,46 @@
+from typing import Optional
+
+from prometheus_client import Counter, Histogram
+
+from application.utils.progress import IngestProgress
+
+
+# Recorded per chunk or batch, never per row, and only rendered when /metrics
+# is scraped.
+STAGE_SECONDS = Counter(
+    "ingest_stage_seconds", "Time spent in each ingest stage", ["stage", "file", "sheet"],
+)
+STAGE_ROWS = Counter(
+    "ingest_stage_rows", "Rows handled by each ingest stage", ["stage", "file", "sheet"],
+)
+BATCH_ROWS = Histogram(
+    "ingest_batch_rows", "Rows per database batch",
+    buckets=(100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000),
+)
+DB_WRITE_SECONDS = Histogram(
+    "ingest_db_write_seconds", "Latency of one batch COPY and merge, up to commit",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+UNMATCHED_MESSAGES = Counter(
+    "ingest_unmatched_messages", "DEP/ARR messages whose flight plan is not in their chunk", ["kind", "file"],
+)
+JOBS = Counter("ingest_jobs", "Finished ingest jobs", ["state"])
+JOB_SECONDS = Histogram(
+    "ingest_job_seconds", "Run time of finished ingest jobs",
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+
+
+def observe_stage(progress: Optional[IngestProgress], stage: str, filename: str, sheet: str,
+                  seconds: float, rows: int):
+    STAGE_SECONDS.labels(stage, filename, sheet).inc(seconds)
+    STAGE_ROWS.labels(stage, filename, sheet).inc(rows)
+    if progress is not None:
+        progress.add_stage(stage, seconds)
+
+def observe_unmatched(progress: Optional[IngestProgress], filename: str, frame):
+    """Count the messages `extract_flights` could not match to a plan in `frame`."""
+    for kind, count in frame.attrs.get("unmatched", {}).items():
+        UNMATCHED_MESSAGES.labels(kind, filename).inc(count)
+        if progress is not None:
+            progress.add_unmatched(kind, count)
@@ -0,0 +1,101 @@
+import shutil
+import tempfile
+import time
+from collections import deque
+from itertools import islice
+from concurrent.futures import Executor
+from typing import BinaryIO, Dict, Iterator, List, Tuple
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from application.utils.extract import extract_columns, extract_flights
+from application.utils.metrics import observe_stage, observe_unmatched
+from application.utils.progress import IngestProgress, ReadPosition
+from application.utils.xlsx import has_message_columns, is_target_sheet, iter_sheet_chunks, read_header, target_rows
+
+# One parsed chunk of a sheet: the frame, the rows it was read from, the
+# carry-over state after it and the time each stage took.
+SheetChunk = Tuple[pd.DataFrame, int, Dict[str, object], Dict[str, float]]
+
+
+def _parse_sheet(path: str, filename: str, sheet: str, chunk_size: int, min_row: int,
+                 state: Dict[str, object]) -> List[SheetChunk]:
+    """Read one sheet from `min_row` on and parse it, as the sequential reader would."""
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet]
+        header = read_header(worksheet)
+        if not has_message_columns(header):
+            return []
+        is_2025 = filename == "2025.xlsx"
+        parsed = []
+        chunks = iter_sheet_chunks(worksheet, header, chunk_size, min_row)
+        while True:
+            started = time.perf_counter()
+            chunk = next(chunks, None)
+            if chunk is None:
+                return parsed
+            read = time.perf_counter()
+            columns = extract_columns(chunk, is_2025)
+            extracted = time.perf_counter()
+            frame = extract_flights(chunk, filename, region=sheet, is_2025=is_2025, state=state, columns=columns)
+            timings = {"read": read - started, "extract": extracted - read, "transform": time.perf_counter() - extracted}
+            parsed.append((frame, len(chunk), dict(state), timings))
+    finally:
+        workbook.close()
+
+
+def iter_xlsx_frames_parallel(source: BinaryIO, filename: str, pool: Executor, processes: int, chunk_size: int,
+                              progress: IngestProgress, position: ReadPosition) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """Parse each target sheet on a worker of `pool`; yields (sheet, frame) in sheet order.
+
+    Carry-over does not cross sheets, so a worker reads and parses its sheet
+    on its own and the frames match the sequential reader's. Up to
+    `processes` sheets are in flight at once. Stage times are the workers'
+    own, so they add up across processes. Reading starts at `position` and
+    advances it as frames are yielded.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".xlsx") as copy:
+        source.seek(0)
+        shutil.copyfileobj(source, copy)
+        copy.flush()
+
+        workbook = load_workbook(copy.name, read_only=True, data_only=True)
+        try:
+            progress.rows_total = target_rows(workbook, filename)
+            sheets = [sheet for sheet in workbook.sheetnames if is_target_sheet(filename, sheet)]
+        finally:
+            workbook.close()
+        if position.sheet in sheets:
+            # Sheets before it were read completely before the position was saved.
+            sheets = sheets[sheets.index(position.sheet):]
+
+        def submit(sheet: str):
+            resume = sheet == position.sheet
+            min_row, state = (2 + position.rows, position.state) if resume else (2, {})
+            return sheet, pool.submit(_parse_sheet, copy.name, filename, sheet, chunk_size, min_row, state)
+
+        queued = iter(sheets)
+        pending = deque(submit(sheet) for sheet in islice(queued, processes))
+        try:
+            while pending:
+                sheet, future = pending.popleft()
+                chunks = future.result()
+                following = next(queued, None)
+                if following is not None:
+                    pending.append(submit(following))
+
+                for frame, rows, state, timings in chunks:
+                    for stage, seconds in timings.items():
+                        observe_stage(progress, stage, filename, sheet, seconds, rows)
+                    observe_unmatched(progress, filename, frame)
+                    progress.add_read(sheet, rows)
+                    position.start_sheet(sheet)
+                    position.rows += rows
+                    position.state = state
+                    yield sheet, frame
+        finally:
+            # The copy goes away with this generator; the sheets still queued need not be read.
+            for _, future in pending:
+                future.cancel()
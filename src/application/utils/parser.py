@@ -1,291 +1,177 @@
-import re
-import io
-import sys
-from datetime import date, time
-from typing import Optional, List, Dict, Union, Tuple
+import os
+import time
+from concurrent.futures import Executor
+from typing import BinaryIO, Iterator, Optional, Tuple
 import pandas as pd
-from sqlalchemy import create_engine, text
+from openpyxl import load_workbook
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
 from sqlalchemy.exc import IntegrityError
 
-DB_CONFIG = {
-    "user": "postgres",
-    "password": "secret",
-    "host": "db",
-    "port": "5432",
-    "database": "flights_db"
-}
-
-TABLE_DDL = """
-CREATE TABLE IF NOT EXISTS flights (
-    id SERIAL PRIMARY KEY,
-    shr_col TEXT,
-    dep_col TEXT,
-    arr_col TEXT,
-    f1 TEXT,
-    f2 TEXT,
-    f3 TEXT,
-    sid TEXT,
-    reg TEXT,
-    dep TEXT,
-    dest TEXT,
-    eet TEXT,
-    zona TEXT,
-    typ TEXT,
-    dof DATE,
-    dep_time TIME,
-    arr_time TIME,
-    region TEXT,
-    file TEXT
-);
-"""
-
-def _sanitize(val) -> Optional[str]:
-    if pd.isna(val):
-        return None
-    return str(val).strip().rstrip(")/")
-
-def _parse_date(d) -> Optional[date]:
-    if pd.isna(d):
-        return None
+from application.utils.extract import extract_columns, extract_flights
+from application.utils.metrics import observe_stage, observe_unmatched
+from application.utils.parallel import iter_xlsx_frames_parallel
+from application.utils.progress import IngestProgress, ReadPosition
+from application.utils.staging import LoadInProgress, StagedLoad
+from application.utils.xlsx import has_message_columns, is_target_sheet, iter_sheet_chunks, read_header, target_rows
+from configuration.config import IngestConfig
+
+# The layout of a file is told by its name; files named otherwise are rejected.
+SUPPORTED_FILES = ("2024.xlsx", "2025.xlsx", "2024.csv", "2025.csv")
+UNSUPPORTED_FILE = f"only {', '.join(SUPPORTED_FILES)}"
+
+def _iter_xlsx_chunks(source: BinaryIO, filename: str, chunk_size: int,
+                      position: Optional[ReadPosition] = None,
+                      progress: Optional[IngestProgress] = None) -> Iterator[Tuple[str, bool, pd.DataFrame]]:
+    resume = position.sheet if position else None
+    workbook = load_workbook(source, read_only=True, data_only=True)
     try:
-        return pd.to_datetime(str(d), format="%y%m%d").date()
-    except Exception:
-        return None
-
-def _parse_time(t) -> Optional[time]:
-    if pd.isna(t):
-        return None
-    s = str(t).zfill(4)
-    try:
-        return pd.to_datetime(s, format="%H%M").time()
-    except Exception:
-        return None
-
-def _write_batch(engine, batch: List[Dict]):
-    if not batch:
-        return
-    df = pd.DataFrame(batch)
-    df.columns = [c.lower() for c in df.columns]
-    try:
-        df.to_sql("flights", engine, if_exists="append", index=False, method="multi")
-    except IntegrityError:
-        raise
-    except Exception as e:
-        raise RuntimeError(f"DB insert error: {e}")
-
-def _process_xlsx(engine, content: bytes, filename: str):
-    buffer = io.BytesIO(content)
-    xls = pd.ExcelFile(buffer)
-    for sheet in xls.sheet_names:
-        df = pd.read_excel(buffer, sheet_name=sheet)
-        batch = []
-        sid = reg = dep = dest = dof = eet = zona = typ = None
-        dep_time = arr_time = None
-        region = None
-        shr_out = shr_in = dep_out = dep_in = arr_out = arr_in = None
-
-        target_sheets = ["Калининград", "Тюмень", "Красноярск", "Иркутск", "Якутск"]
-        is_2024_special = filename == "2024.xlsx" and sheet in target_sheets
-        is_2025 = filename == "2025.xlsx"
-        if not (is_2024_special or is_2025):
-            continue
-
-        for _, row in df.iterrows():
-            shr_text = row.get("SHR")
-            dep_text = row.get("DEP")
-            arr_text = row.get("ARR")
-
-            region = row.get("Центр ЕС ОрВД") if is_2025 else sheet
-
-            if pd.notna(shr_text):
-                m = re.search(r"([\s\S]*)\(([\s\S]*)\)", str(shr_text))
-                if m:
-                    shr_out, shr_in = m.group(1), m.group(2)
-                    if shr_in:
-                        sid_m = re.search(r"SID/(\S+)", shr_in)
-                        sid = sid_m.group(1) if sid_m else None
-                        reg_m = re.search(r"REG/(\S+)", shr_in)
-                        reg = reg_m.group(1) if reg_m else None
-                        dep_m = re.search(r"DEP/(\S+)", shr_in)
-                        dep = dep_m.group(1) if dep_m else None
-                        dest_m = re.search(r"DEST/(\S+)", shr_in)
-                        dest = dest_m.group(1) if dest_m else None
-                        dof_m = re.search(r"DOF/(\S+)", shr_in)
-                        dof = dof_m.group(1) if dof_m else None
-                        eet_m = re.search(r"EET/(\S+)", shr_in)
-                        eet = eet_m.group(1) if eet_m else None
-                        typ_m = re.search(r"TYP/(\S+)", shr_in)
-                        typ = typ_m.group(1) if typ_m else None
-                        zona_m = re.search(r"ZONA ([^\/]+)\/", shr_in)
-                        zona = zona_m.group(1) if zona_m else None
-
-            if pd.notna(dep_text):
-                dep_str = str(dep_text)
-                if is_2025:
-                    m = re.search(r"-ATD\s*(\d{4})", dep_str)
-                    dep_time = m.group(1) if m else None
-                else:
-                    m = re.search(r"([\s\S]*)\(([\s\S]*)\)", dep_str)
-                    if m:
-                        dep_out, dep_in = m.group(1), m.group(2)
-                        if dep_in:
-                            m2 = re.search(r"DEP-[\s\S]*-ZZZZ(\d{4})", dep_in)
-                            dep_time = m2.group(1) if m2 else None
-
-            if pd.notna(arr_text):
-                arr_str = str(arr_text)
-                if is_2025:
-                    m = re.search(r"-ATA\s*(\d{4})", arr_str)
-                    arr_time = m.group(1) if m else None
-                else:
-                    m = re.search(r"([\s\S]*)\(([\s\S]*)\)", arr_str)
-                    if m:
-                        arr_out, arr_in = m.group(1), m.group(2)
-                        if arr_in:
-                            m2 = re.search(r"ARR-[\s\S]*-[\s\S]*-ZZZZ(\d{4})", arr_in)
-                            arr_time = m2.group(1) if m2 else None
-
-            batch.append({
-                "SHR_COL": shr_text if pd.notna(shr_text) else None,
-                "DEP_COL": dep_text if pd.notna(dep_text) else None,
-                "ARR_COL": arr_text if pd.notna(arr_text) else None,
-                "F1": _sanitize(shr_out),
-                "F2": _sanitize(dep_out),
-                "F3": _sanitize(arr_out),
-                "SID": _sanitize(sid),
-                "REG": _sanitize(reg),
-                "DEP": _sanitize(dep),
-                "DEST": _sanitize(dest),
-                "EET": _sanitize(eet),
-                "ZONA": _sanitize(zona),
-                "TYP": _sanitize(typ),
-                "DOF": _parse_date(dof),
-                "DEP_TIME": _parse_time(dep_time),
-                "ARR_TIME": _parse_time(arr_time),
-                "REGION": _sanitize(region),
-                "FILE": filename
-            })
-
-            if len(batch) >= 100:
-                _write_batch(engine, batch)
-                batch = []
-
-        if batch:
-            _write_batch(engine, batch)
-
-def _process_csv(engine, content: bytes, filename: str):
-    df = pd.read_csv(io.BytesIO(content), dtype=str)
-    batch = []
-    sid = reg = dep = dest = dof = eet = zona = typ = None
-    dep_time = arr_time = None
-    region = None
-    shr_out = shr_in = dep_out = dep_in = arr_out = arr_in = None
-
+        if progress is not None:
+            progress.rows_total = target_rows(workbook, filename)
+        for sheet in workbook.sheetnames:
+            if not is_target_sheet(filename, sheet):
+                continue
+            min_row = 2
+            if resume is not None:
+                if sheet != resume:
+                    # Read completely before the position was saved.
+                    continue
+                resume, min_row = None, 2 + position.rows
+            worksheet = workbook[sheet]
+            header = read_header(worksheet)
+            if not has_message_columns(header):
+                continue
+
+            is_2025 = filename == "2025.xlsx"
+            for chunk in iter_sheet_chunks(worksheet, header, chunk_size, min_row):
+                yield sheet, is_2025, chunk
+    finally:
+        workbook.close()
+
+def _size(source: BinaryIO) -> int:
+    current = source.tell()
+    size = source.seek(0, os.SEEK_END)
+    source.seek(current)
+    return size
+
+def _iter_csv_chunks(source: BinaryIO, filename: str, chunk_size: int,
+                     position: Optional[ReadPosition] = None,
+                     progress: Optional[IngestProgress] = None) -> Iterator[Tuple[str, bool, pd.DataFrame]]:
     is_2025 = filename == "2025.csv"
-    is_2024 = filename == "2024.csv"
-
-    if not (is_2024 or is_2025):
-        return
-
-    for _, row in df.iterrows():
-        shr_text = row.get("SHR")
-        dep_text = row.get("DEP")
-        arr_text = row.get("ARR")
-
-        region = row.get("Центр ЕС ОрВД") if is_2025 else "CSV"
-
-        if pd.notna(shr_text):
-            m = re.search(r"([\s\S]*)\(([\s\S]*)\)", str(shr_text))
-            if m:
-                shr_out, shr_in = m.group(1), m.group(2)
-                if shr_in:
-                    sid_m = re.search(r"SID/(\S+)", shr_in)
-                    sid = sid_m.group(1) if sid_m else None
-                    reg_m = re.search(r"REG/(\S+)", shr_in)
-                    reg = reg_m.group(1) if reg_m else None
-                    dep_m = re.search(r"DEP/(\S+)", shr_in)
-                    dep = dep_m.group(1) if dep_m else None
-                    dest_m = re.search(r"DEST/(\S+)", shr_in)
-                    dest = dest_m.group(1) if dest_m else None
-                    dof_m = re.search(r"DOF/(\S+)", shr_in)
-                    dof = dof_m.group(1) if dof_m else None
-                    eet_m = re.search(r"EET/(\S+)", shr_in)
-                    eet = eet_m.group(1) if eet_m else None
-                    typ_m = re.search(r"TYP/(\S+)", shr_in)
-                    typ = typ_m.group(1) if typ_m else None
-                    zona_m = re.search(r"ZONA ([^\/]+)\/", shr_in)
-                    zona = zona_m.group(1) if zona_m else None
-
-        if pd.notna(dep_text):
-            dep_str = str(dep_text)
-            if is_2025:
-                m = re.search(r"-ATD\s*(\d{4})", dep_str)
-                dep_time = m.group(1) if m else None
-            else:
-                m = re.search(r"([\s\S]*)\(([\s\S]*)\)", dep_str)
-                if m:
-                    dep_out, dep_in = m.group(1), m.group(2)
-                    if dep_in:
-                        m2 = re.search(r"DEP-[\s\S]*-ZZZZ(\d{4})", dep_in)
-                        dep_time = m2.group(1) if m2 else None
-
-        if pd.notna(arr_text):
-            arr_str = str(arr_text)
-            if is_2025:
-                m = re.search(r"-ATA\s*(\d{4})", arr_str)
-                arr_time = m.group(1) if m else None
-            else:
-                m = re.search(r"([\s\S]*)\(([\s\S]*)\)", arr_str)
-                if m:
-                    arr_out, arr_in = m.group(1), m.group(2)
-                    if arr_in:
-                        m2 = re.search(r"ARR-[\s\S]*-[\s\S]*-ZZZZ(\d{4})", arr_in)
-                        arr_time = m2.group(1) if m2 else None
-
-        batch.append({
-            "SHR_COL": shr_text if pd.notna(shr_text) else None,
-            "DEP_COL": dep_text if pd.notna(dep_text) else None,
-            "ARR_COL": arr_text if pd.notna(arr_text) else None,
-            "F1": _sanitize(shr_out),
-            "F2": _sanitize(dep_out),
-            "F3": _sanitize(arr_out),
-            "SID": _sanitize(sid),
-            "REG": _sanitize(reg),
-            "DEP": _sanitize(dep),
-            "DEST": _sanitize(dest),
-            "EET": _sanitize(eet),
-            "ZONA": _sanitize(zona),
-            "TYP": _sanitize(typ),
-            "DOF": _parse_date(dof),
-            "DEP_TIME": _parse_time(dep_time),
-            "ARR_TIME": _parse_time(arr_time),
-            "REGION": _sanitize(region),
-            "FILE": filename
-        })
-
-        if len(batch) >= 100:
-            _write_batch(engine, batch)
-            batch = []
-
-    if batch:
-        _write_batch(engine, batch)
+    # Rows are only counted after pandas drops blank lines, so resuming skips
+    # parsed rows rather than lines of the file.
+    skip = position.rows if position and position.sheet == "CSV" else 0
+    size, rows = _size(source), 0
+    for chunk in pd.read_csv(source, dtype=str, chunksize=chunk_size):
+        rows += len(chunk)
+        consumed = source.tell()
+        if progress is not None and consumed:
+            # Extrapolated from the bytes pandas has consumed so far.
+            progress.rows_total = round(rows * size / consumed)
+        if skip:
+            skipped = min(skip, len(chunk))
+            chunk, skip = chunk.iloc[skipped:], skip - skipped
+            if chunk.empty:
+                continue
+        yield "CSV", is_2025, chunk
+
+def iter_raw_chunks(source: BinaryIO, filename: str, chunk_size: int,
+                    position: Optional[ReadPosition] = None) -> Iterator[Tuple[str, bool, pd.DataFrame]]:
+    """Unparsed row chunks of a file as (region, is_2025, chunk), from `position` when given.
+
+    Chunks of one region are consecutive, so carry-over state can be reset
+    whenever the region changes.
+    """
+    if filename.lower().endswith('.xlsx'):
+        return _iter_xlsx_chunks(source, filename, chunk_size, position)
+    return _iter_csv_chunks(source, filename, chunk_size, position)
+
+def _iter_frames(chunks: Iterator[Tuple[str, bool, pd.DataFrame]], filename: str,
+                 progress: IngestProgress, position: ReadPosition) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """(sheet, frame) per chunk, timing the read, extract and transform stages.
+
+    `position` is advanced past each chunk before its frame is yielded.
+    """
+    chunks = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        item = next(chunks, None)
+        if item is None:
+            return
+        region, is_2025, chunk = item
+        read = time.perf_counter()
+        observe_stage(progress, "read", filename, region, read - started, len(chunk))
+        progress.add_read(region, len(chunk))
+
+        position.start_sheet(region)
+        columns = extract_columns(chunk, is_2025)
+        extracted = time.perf_counter()
+        observe_stage(progress, "extract", filename, region, extracted - read, len(chunk))
+        frame = extract_flights(chunk, filename, region=region, is_2025=is_2025, state=position.state,
+                                columns=columns)
+        observe_stage(progress, "transform", filename, region, time.perf_counter() - extracted, len(chunk))
+        observe_unmatched(progress, filename, frame)
+        position.rows += len(chunk)
+        yield region, frame
+
+def _iter_xlsx_frames(source: BinaryIO, filename: str, config: IngestConfig, progress: IngestProgress,
+                      position: ReadPosition, pool: Optional[Executor]) -> Iterator[Tuple[str, pd.DataFrame]]:
+    if pool is not None:
+        return iter_xlsx_frames_parallel(source, filename, pool, config.parse_processes, config.chunk_size,
+                                         progress, position)
+    return _iter_frames(_iter_xlsx_chunks(source, filename, config.chunk_size, position, progress), filename,
+                        progress, position)
+
+def _iter_csv_frames(source: BinaryIO, filename: str, config: IngestConfig, progress: IngestProgress,
+                     position: ReadPosition) -> Iterator[Tuple[str, pd.DataFrame]]:
+    return _iter_frames(_iter_csv_chunks(source, filename, config.chunk_size, position, progress), filename,
+                        progress, position)
+
+def iter_flight_frames(source: BinaryIO, filename: str, config: IngestConfig, progress: IngestProgress,
+                       position: Optional[ReadPosition] = None,
+                       pool: Optional[Executor] = None) -> Optional[Iterator[Tuple[str, pd.DataFrame]]]:
+    """Parsed flights of a file as (sheet, frame) chunks; None when it is not one of SUPPORTED_FILES.
+
+    Reading starts at `position` once iteration begins, and advances it. With
+    a process `pool`, the sheets of a workbook are parsed on it.
+    """
+    position = position or ReadPosition()
+    if filename not in SUPPORTED_FILES:
+        return None
+    if filename.endswith('.xlsx'):
+        return _iter_xlsx_frames(source, filename, config, progress, position, pool)
+    return _iter_csv_frames(source, filename, config, progress, position)
 
-def parse_file(filename: str, content: bytes) -> Optional[str]:
-    url = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
-    engine = create_engine(url)
+def _already_ingested(engine: Engine, fingerprint: str) -> bool:
     with engine.connect() as conn:
-        conn.execute(text(TABLE_DDL))
-        conn.commit()
-
+        found = conn.execute(
+            text("SELECT 1 FROM ingested_files WHERE fingerprint = :fingerprint"),
+            {"fingerprint": fingerprint},
+        )
+        return found.first() is not None
+
+def parse_file(engine: Engine, filename: str, source: BinaryIO, config: IngestConfig,
+               progress: Optional[IngestProgress] = None, fingerprint: Optional[str] = None,
+               pool: Optional[Executor] = None) -> Optional[str]:
+    progress = progress or IngestProgress()
     try:
-        if filename.lower().endswith('.xlsx'):
-            _process_xlsx(engine, content, filename)
-        elif filename.lower().endswith('.csv'):
-            _process_csv(engine, content, filename)
-        else:
-            return "only csv xlsx"
+        position = ReadPosition()
+        frames = iter_flight_frames(source, filename, config, progress, position, pool)
+        if frames is None:
+            return UNSUPPORTED_FILE
+
+        if fingerprint and _already_ingested(engine, fingerprint):
+            progress.skipped = True
+            return None
+        with StagedLoad(engine, filename, fingerprint, config.checkpoint_batches, position) as load:
+            progress.resumed_rows = progress.rows_read = load.rows
+            for sheet, frame in frames:
+                load.write_frame(frame, config.batch_size, progress, sheet)
+            load.promote(progress)
         return None
+    except LoadInProgress as e:
+        return str(e)
     except IntegrityError:
         return "unique constraint violation"
     except Exception as e:
-        return f"Processing failed: {str(e)}"
\ No newline at end of file
+        return f"Processing failed: {str(e)}"
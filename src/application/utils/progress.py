@@ -0,0 +1,49 @@
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+
+@dataclass
+class IngestProgress:
+    """Counters the ingest pipeline bumps once per chunk or batch.
+
+    Readers only assign plain fields here; anything derived, such as
+    throughput, is computed by whoever reads them.
+    """
+    rows_read: int = 0
+    rows_total: Optional[int] = None
+    sheet: Optional[str] = None
+    rows_written: int = 0
+    resumed_rows: int = 0
+    skipped: bool = False
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+    unmatched: Dict[str, int] = field(default_factory=dict)
+
+    def add_read(self, sheet: str, count: int):
+        self.sheet = sheet
+        self.rows_read += count
+
+    def add_rows(self, count: int):
+        self.rows_written += count
+
+    def add_stage(self, stage: str, seconds: float):
+        self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+    def add_unmatched(self, kind: str, count: int):
+        self.unmatched[kind] = self.unmatched.get(kind, 0) + count
+
+
+@dataclass
+class ReadPosition:
+    """How far a file has been read: the sheets before `sheet` are done, and so
+    are the first `rows` data rows of `sheet`, which left the carry-over `state`.
+
+    Readers advance it as they yield frames and start from it when it is set, so
+    a load can be resumed where it stopped.
+    """
+    sheet: Optional[str] = None
+    rows: int = 0
+    state: Dict[str, object] = field(default_factory=dict)
+
+    def start_sheet(self, sheet: str):
+        if sheet != self.sheet:
+            self.sheet, self.rows, self.state = sheet, 0, {}
@@ -0,0 +1,292 @@
+import io
+import json
+import time
+import uuid
+from typing import Optional
+
+import pandas as pd
+import psycopg2
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from application.utils.columns import MESSAGE_KEY_COLUMNS
+from application.utils.db import LOAD_STAGE_DDL, STAGE_DDL
+from application.utils.messages import DB_COLUMNS, HashCache, split_messages
+from application.utils.metrics import BATCH_ROWS, DB_WRITE_SECONDS, observe_stage
+from application.utils.progress import IngestProgress, ReadPosition
+
+COPY_NULL = "\\N"
+
+# Hashes of raw messages this process has already stored, so repeated messages
+# are not sent again with every batch.
+_STORED_MESSAGES = HashCache(200_000)
+
+_COPY_MESSAGES_SQL = f"COPY messages_batch (hash, body) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"
+_INSERT_MESSAGES_SQL = """
+INSERT INTO raw_messages (hash, body)
+SELECT hash, body FROM messages_batch
+ON CONFLICT (hash) DO NOTHING
+"""
+_MERGE_SQL = "SELECT flights_merge_batch()"
+_SAVE_CHECKPOINT_SQL = """
+INSERT INTO ingest_checkpoints (fingerprint, filename, stage_table, frames, rows, sheet, sheet_rows, carry)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+ON CONFLICT (fingerprint) DO UPDATE SET
+    frames = EXCLUDED.frames, rows = EXCLUDED.rows, sheet = EXCLUDED.sheet,
+    sheet_rows = EXCLUDED.sheet_rows, carry = EXCLUDED.carry, updated_at = now()
+"""
+_RECORD_INGESTED_SQL = """
+INSERT INTO ingested_files (fingerprint, filename, rows)
+VALUES (%s, %s, %s) ON CONFLICT (fingerprint) DO NOTHING
+"""
+
+def _promote_sql(table: str, next_day: bool) -> str:
+    """Move the staged rows into flights_batch with DEP/ARR joined over the whole file.
+
+    A chunk only matched the messages it contained; where the file has a
+    message for a row's plan, the latest one in the file wins, unless the
+    plan's own row has one naming it. With `next_day` an ARR dated the day
+    after the plan's DOF is taken when there is none of its DOF, as for
+    overnight flights in the 2025 layout.
+    """
+    def own(key: str) -> str:
+        return (f"CASE WHEN s.shr_hash IS NOT NULL AND s.{key}_msg_sid = s.sid AND s.{key}_msg_dof = s.dof "
+                f"THEN s.{key}_msg_time END")
+
+    times = {key: f"coalesce({own(key)}, {key}.time, s.{key}_time)" for key in ("dep", "arr")}
+    if next_day:
+        times["arr"] = f"coalesce({own('arr')}, arr.time, arr_next.time, s.arr_time)"
+    values = {c: f"s.{c}" for c in DB_COLUMNS}
+    values["dep_time"], values["arr_time"] = times["dep"], times["arr"]
+    values["block_minutes"] = f"(EXTRACT(EPOCH FROM {times['arr']} - {times['dep']})::int / 60 + 1440) % 1440"
+    messages = ", ".join(
+        f"""{key} AS (
+            SELECT DISTINCT ON ({key}_msg_sid, {key}_msg_dof, region)
+                   {key}_msg_sid AS sid, {key}_msg_dof AS dof, region, {key}_msg_time AS time
+            FROM {table}
+            WHERE {key}_msg_sid IS NOT NULL AND {key}_msg_dof IS NOT NULL
+            ORDER BY {key}_msg_sid, {key}_msg_dof, region, row_no DESC
+        )"""
+        for key in ("dep", "arr")
+    )
+    joins = [
+        f"LEFT JOIN {key} ON {key}.sid = s.sid AND {key}.dof = s.dof AND {key}.region IS NOT DISTINCT FROM s.region"
+        for key in ("dep", "arr")
+    ]
+    if next_day:
+        joins.append("LEFT JOIN arr arr_next ON arr_next.sid = s.sid AND arr_next.dof = s.dof + 1 "
+                     "AND arr_next.region IS NOT DISTINCT FROM s.region")
+    joins = "\n".join(joins)
+    return f"""
+        WITH {messages}
+        INSERT INTO flights_batch ({", ".join(DB_COLUMNS)})
+        SELECT {", ".join(values.values())}
+        FROM {table} s
+        {joins}
+        ORDER BY s.row_no
+    """
+
+def _unmatched_sql(table: str, key: str, next_day: bool) -> str:
+    """Staged DEP or ARR messages that name a plan no SHR of the file has."""
+    dof = f"(p.dof = m.{key}_msg_dof OR p.dof = m.{key}_msg_dof - 1)" if next_day else f"p.dof = m.{key}_msg_dof"
+    return f"""
+        SELECT count(*)
+        FROM {table} m
+        WHERE m.{key}_msg_sid IS NOT NULL AND m.{key}_msg_dof IS NOT NULL AND NOT EXISTS (
+            SELECT 1
+            FROM {table} p
+            WHERE p.shr_hash IS NOT NULL
+              AND p.sid = m.{key}_msg_sid AND {dof}
+              AND p.region IS NOT DISTINCT FROM m.region
+        )
+    """
+
+def _csv(frame: pd.DataFrame) -> io.StringIO:
+    buffer = io.StringIO()
+    frame.to_csv(buffer, header=False, index=False, na_rep=COPY_NULL)
+    buffer.seek(0)
+    return buffer
+
+
+class LoadInProgress(Exception):
+    pass
+
+
+class StagedLoad:
+    """Loads one file into `flights` through a staging table of its own.
+
+    Batches are COPYed into the staging table and committed one by one. After
+    every `checkpoint_batches` batches, at the next frame boundary, the read
+    position is saved next to them. `promote()` then moves the whole file into
+    `flights` in a single transaction, so readers never see part of a file.
+
+    This gives up on rows showing up in `flights` while a file is still being
+    read, deliberately: memory stays bounded by the chunk size, but nothing of
+    the file is visible until its last chunk is staged. In exchange, a failed
+    load leaves nothing behind and can resume, and DEP/ARR are matched over
+    the whole file. `rows_written` in the job progress counts staged rows.
+
+    A load that fails keeps its staged rows and checkpoint. Loading the same
+    content again (same fingerprint) restores `position` and only reads the
+    rest of the file. Without a fingerprint a load cannot be resumed, and its
+    table is dropped on close.
+    """
+
+    def __init__(self, engine: Engine, filename: str, fingerprint: Optional[str] = None,
+                 checkpoint_batches: int = 10, position: Optional[ReadPosition] = None):
+        self.filename = filename
+        self.fingerprint = fingerprint
+        self.table = f"ingest_stage_{(fingerprint or uuid.uuid4().hex)[:32]}"
+        self.position = position or ReadPosition()
+        self.frames = 0
+        self.rows = 0
+        self._engine = engine
+        self._checkpoint_batches = checkpoint_batches
+        self._batches = 0
+        self._conn = None
+
+    def __enter__(self) -> "StagedLoad":
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self):
+        """Create or reattach to the staging table; returns the number of rows resumed."""
+        self._conn = self._engine.raw_connection()
+        with self._conn.cursor() as cursor:
+            # Two loads of the same content would stage into the same table.
+            cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (self.table,))
+            if not cursor.fetchone()[0]:
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+                raise LoadInProgress(f"{self.filename} is already being ingested")
+            cursor.execute(STAGE_DDL)
+            cursor.execute(LOAD_STAGE_DDL.format(table=self.table))
+            self._restore(cursor)
+        self._conn.commit()
+        return self.rows
+
+    def _restore(self, cursor):
+        checkpoint = None
+        if self.fingerprint:
+            cursor.execute(
+                "SELECT frames, rows, sheet, sheet_rows, carry FROM ingest_checkpoints WHERE fingerprint = %s",
+                (self.fingerprint,),
+            )
+            checkpoint = cursor.fetchone()
+        frames, rows = (checkpoint[0], checkpoint[1]) if checkpoint else (0, 0)
+
+        # Batches committed after the last checkpoint are read again.
+        cursor.execute(f"DELETE FROM {self.table} WHERE frame_no >= %s", (frames,))
+        cursor.execute(f"SELECT count(*) FROM {self.table}")
+        if cursor.fetchone()[0] != rows:
+            # An unlogged table is emptied by a server crash; start over.
+            cursor.execute(f"TRUNCATE {self.table}")
+            cursor.execute("DELETE FROM ingest_checkpoints WHERE fingerprint = %s", (self.fingerprint,))
+            return
+        if checkpoint:
+            self.frames, self.rows = frames, rows
+            self.position.sheet, self.position.rows = checkpoint[2], checkpoint[3]
+            self.position.state = checkpoint[4] or {}
+
+    def write_batch(self, batch: pd.DataFrame):
+        if batch.empty:
+            return
+        rows, messages, new_hashes = split_messages(batch, _STORED_MESSAGES)
+        rows = rows.join(batch[MESSAGE_KEY_COLUMNS])
+        rows.insert(0, "frame_no", self.frames)
+
+        started = time.perf_counter()
+        try:
+            with self._conn.cursor() as cursor:
+                if not messages.empty:
+                    cursor.copy_expert(_COPY_MESSAGES_SQL, _csv(messages))
+                    cursor.execute(_INSERT_MESSAGES_SQL)
+                cursor.copy_expert(
+                    f"COPY {self.table} (frame_no, {', '.join(DB_COLUMNS + MESSAGE_KEY_COLUMNS)}) "
+                    f"FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+                    _csv(rows),
+                )
+            self._conn.commit()
+        except Exception as e:
+            self._conn.rollback()
+            raise RuntimeError(f"DB insert error: {e}")
+        _STORED_MESSAGES.add(new_hashes)
+        DB_WRITE_SECONDS.observe(time.perf_counter() - started)
+        self._batches += 1
+
+    def write_frame(self, frame: pd.DataFrame, batch_size: int, progress: IngestProgress, sheet: str):
+        """Stage one frame of the reader that advances `position`."""
+        for start in range(0, len(frame), batch_size):
+            batch = frame.iloc[start:start + batch_size]
+            started = time.perf_counter()
+            self.write_batch(batch)
+            observe_stage(progress, "load", self.filename, sheet, time.perf_counter() - started, len(batch))
+            BATCH_ROWS.observe(len(batch))
+            progress.add_rows(len(batch))
+        self.frames += 1
+        self.rows += len(frame)
+        if self.fingerprint and self._batches >= self._checkpoint_batches:
+            self.checkpoint()
+
+    def checkpoint(self):
+        with self._conn.cursor() as cursor:
+            cursor.execute(_SAVE_CHECKPOINT_SQL, (
+                self.fingerprint, self.filename, self.table, self.frames, self.rows,
+                self.position.sheet, self.position.rows, json.dumps(self.position.state),
+            ))
+        self._conn.commit()
+        self._batches = 0
+
+    def promote(self, progress: Optional[IngestProgress] = None):
+        """Merge all staged rows into `flights` in one transaction.
+
+        `progress.unmatched` is replaced by the count of messages whose plan is
+        not in the whole file, rather than their chunk.
+        """
+        started = time.perf_counter()
+        try:
+            with self._conn.cursor() as cursor:
+                # 2025 ARR messages are dated by the arrival, not the DOF.
+                next_day = self.filename.startswith("2025")
+                cursor.execute(_promote_sql(self.table, next_day))
+                cursor.execute(_MERGE_SQL)
+                unmatched = {}
+                for key in ("dep", "arr"):
+                    cursor.execute(_unmatched_sql(self.table, key, next_day and key == "arr"))
+                    unmatched[key] = cursor.fetchone()[0]
+                if self.fingerprint:
+                    # A file without rows is read again next time rather than
+                    # skipped for good.
+                    if self.rows:
+                        cursor.execute(_RECORD_INGESTED_SQL, (self.fingerprint, self.filename, self.rows))
+                    cursor.execute("DELETE FROM ingest_checkpoints WHERE fingerprint = %s", (self.fingerprint,))
+                cursor.execute(f"DROP TABLE {self.table}")
+            self._conn.commit()
+        except psycopg2.IntegrityError as e:
+            self._conn.rollback()
+            raise IntegrityError(_MERGE_SQL, None, e)
+        except Exception as e:
+            self._conn.rollback()
+            raise RuntimeError(f"DB promote error: {e}")
+        if progress is not None:
+            progress.unmatched = unmatched
+        observe_stage(progress, "promote", self.filename, "", time.perf_counter() - started, self.rows)
+
+    def close(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.rollback()
+            with self._conn.cursor() as cursor:
+                if not self.fingerprint:
+                    cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+                cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", (self.table,))
+            self._conn.commit()
+        finally:
+            self._conn.close()
+            self._conn = None
+
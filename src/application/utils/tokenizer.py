@@ -0,0 +1,60 @@
+import re
+from typing import Dict, Optional, Tuple
+
+
+SHR_KEYS = ("SID", "REG", "DEP", "DEST", "DOF", "EET", "TYP", "ZONA")
+
+# ICAO field 18 items are `KEY/value`; ZONA is written as `ZONA <area>/`.
+# Patterns start with a character class (no lookbehind) so the regex engine can
+# skip ahead to candidate positions instead of trying every offset.
+_ITEM = re.compile(r"([A-Z]{3,4})/|ZONA ([^/]+)/")
+# shr_fields() looks for each key with str.find, which is far cheaper than a
+# regex scan, and reads the value with an anchored match. Like a search for
+# that key alone, it also finds keys inside another word or value (`ADEP/`,
+# `REG/RA1/TYP/BLA`, `RMK/ZONA ...`).
+_SHR_KEYS = tuple((f"{key}/", re.compile(r"\S+")) for key in SHR_KEYS[:-1]) + (("ZONA ", re.compile(r"[^/]+(?=/)")),)
+
+
+def tokenize(text: str) -> Dict[str, str]:
+    """All `KEY/value` items of a message; values may span several words.
+
+    A value runs up to the next item. Unknown keys are kept as they are; for
+    repeated keys the first non-empty value wins.
+    """
+    items = {}
+    key = start = None
+    for m in _ITEM.finditer(text):
+        if key is not None:
+            value = text[start:m.start()].strip()
+            if value:
+                items.setdefault(key, value)
+        if m.group(2) is not None:
+            items.setdefault("ZONA", m.group(2))
+            key = None
+        else:
+            key, start = m.group(1), m.end()
+    if key is not None:
+        value = text[start:].strip()
+        if value:
+            items.setdefault(key, value)
+    return items
+
+def shr_fields(text: str) -> Tuple[Optional[str], ...]:
+    """SID, REG, DEP, DEST, DOF, EET, TYP and ZONA of an SHR message.
+
+    Gives what the former per-key searches gave: for each key the first
+    occurrence that has a value, which is the next word, or for ZONA
+    everything up to its closing slash.
+    """
+    found = []
+    for key, value in _SHR_KEYS:
+        at = text.find(key)
+        while at != -1:
+            m = value.match(text, at + len(key))
+            if m:
+                found.append(m.group())
+                break
+            at = text.find(key, at + 1)
+        else:
+            found.append(None)
+    return tuple(found)
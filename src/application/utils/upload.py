@@ -0,0 +1,236 @@
+import hashlib
+import zipfile
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, List, Optional, Tuple
+
+from python_multipart import MultipartParser
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import parse_options_header
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+from configuration.config import UploadConfig
+
+
+ARCHIVE_SUFFIX = ".zip"
+MEMBER_SUFFIXES = (".csv", ".xlsx")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class InvalidUpload(Exception):
+    pass
+
+
+@dataclass
+class SpooledFile:
+    """One file of an upload, ready to be parsed, or the reason it was rejected."""
+    filename: str
+    spool: Optional[SpooledTemporaryFile] = None
+    fingerprint: Optional[str] = None
+    error: Optional[str] = None
+
+    def close(self):
+        if self.spool is not None:
+            self.spool.close()
+
+
+class _Spool:
+    """A spooled temporary file that tracks the size and SHA-256 of what is written."""
+
+    def __init__(self, config: UploadConfig):
+        self.file = SpooledTemporaryFile(max_size=config.spool_max_memory)
+        self._digest = hashlib.sha256()
+        self._size = 0
+        self._max_size = config.max_size
+
+    def write(self, chunk: bytes):
+        self._size += len(chunk)
+        if self._size > self._max_size:
+            raise UploadTooLarge(f"file exceeds {self._max_size} bytes")
+        self._digest.update(chunk)
+        self.file.write(chunk)
+
+    def finish(self) -> Tuple[SpooledTemporaryFile, str]:
+        self.file.seek(0)
+        return self.file, self._digest.hexdigest()
+
+
+class _FormSpooler:
+    """Multipart callbacks that spool the files of one form field as they arrive.
+
+    A file over `max_size` is rejected as soon as it gets there and the rest of
+    it is skipped, so nothing but the spools ever holds an upload.
+    """
+
+    def __init__(self, field: str, config: UploadConfig, max_files: int):
+        self.files: List[SpooledFile] = []
+        self._field = field
+        self._config = config
+        self._max_files = max_files
+        self._header_field = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._spool: Optional[_Spool] = None
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field_data,
+            "on_header_value": self._header_value_data,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def _part_begin(self):
+        self._disposition = b""
+
+    def _header_field_data(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _header_value_data(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _header_end(self):
+        if self._header_field.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if options.get(b"name") != self._field.encode() or b"filename" not in options:
+            return
+        if len(self.files) >= self._max_files:
+            raise UploadTooLarge(f"more than {self._max_files} files")
+        self.files.append(SpooledFile(options[b"filename"].decode("utf-8", "replace")))
+        self._spool = _Spool(self._config)
+
+    def _part_data(self, data: bytes, start: int, end: int):
+        if self._spool is None:
+            return
+        try:
+            self._spool.write(data[start:end])
+        except UploadTooLarge as e:
+            self._spool.file.close()
+            self._spool = None
+            # With a single file there is nothing left worth reading the body for.
+            if self._max_files == 1:
+                raise
+            self.files[-1].error = str(e)
+
+    def _part_end(self):
+        if self._spool is not None:
+            self.files[-1].spool, self.files[-1].fingerprint = self._spool.finish()
+            self._spool = None
+
+    @property
+    def pending(self) -> bool:
+        return self._spool is not None
+
+    def close(self):
+        if self._spool is not None:
+            self._spool.file.close()
+        for file in self.files:
+            file.close()
+
+
+async def spool_form(request: Request, field: str, config: UploadConfig, max_files: int = 1) -> List[SpooledFile]:
+    """Spool the files of a multipart/form-data `field` straight from the request body.
+
+    Each file is written once, to its own spool, hashed on the way; files over
+    `max_size` come back with an error, or raise UploadTooLarge when only one
+    is expected. Also raises UploadTooLarge for more than `max_files` files or
+    a Content-Length that cannot fit them, and
+    InvalidUpload when the body is not a form with `field`.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise InvalidUpload("expected multipart/form-data")
+    length = request.headers.get("content-length")
+    # Multipart framing adds well under a chunk per file.
+    if length and length.isdigit() and int(length) > max_files * (config.max_size + config.chunk_size):
+        raise UploadTooLarge(f"upload exceeds {config.max_size} bytes per file")
+
+    spooler = _FormSpooler(field, config, max_files)
+    parser = MultipartParser(options[b"boundary"], spooler.callbacks())
+    try:
+        async for chunk in request.stream():
+            # Spools roll over to disk; keep their writes off the event loop.
+            await run_in_threadpool(parser.write, chunk)
+        parser.finalize()
+        if spooler.pending:
+            raise InvalidUpload("upload ended inside a file")
+    except MultipartParseError as e:
+        spooler.close()
+        raise InvalidUpload(str(e))
+    except BaseException:
+        spooler.close()
+        raise
+    if not spooler.files:
+        raise InvalidUpload(f"no file in form field {field!r}")
+    return spooler.files
+
+def _spool_stream(stream: BinaryIO, config: UploadConfig) -> Tuple[SpooledTemporaryFile, str]:
+    spool = _Spool(config)
+    try:
+        while chunk := stream.read(config.chunk_size):
+            spool.write(chunk)
+    except BaseException:
+        spool.file.close()
+        raise
+    return spool.finish()
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_SUFFIX)
+
+def spool_archive(archive: BinaryIO, config: UploadConfig) -> List[SpooledFile]:
+    """Spool the CSV/XLSX members of a ZIP archive one at a time.
+
+    Members are decompressed as a stream into their own spooled files, so only
+    `spool_max_memory` of each is held in memory. Other members, and members
+    that cannot be extracted (too large, encrypted, corrupt, unsupported
+    compression), are reported as rejected. Raises UploadTooLarge when the
+    members add up to more than `max_archive_size` bytes. Blocking; run it off
+    the event loop.
+    """
+    files: List[SpooledFile] = []
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            members = [info for info in zf.infolist()
+                       if not info.is_dir() and not info.filename.startswith("__MACOSX/")]
+            if len(members) > config.max_files:
+                raise UploadTooLarge(f"archive has more than {config.max_files} files")
+            # zipfile stops each member at its declared size (a lie then fails
+            # the CRC check), so the declared sizes bound what is decompressed.
+            if sum(info.file_size for info in members) > config.max_archive_size:
+                raise UploadTooLarge(f"archive exceeds {config.max_archive_size} bytes uncompressed")
+            for info in members:
+                # The parser dispatches on the bare file name, as for single uploads.
+                name = PurePosixPath(info.filename).name
+                if not name.lower().endswith(MEMBER_SUFFIXES):
+                    files.append(SpooledFile(name, error="only csv xlsx"))
+                    continue
+                if info.flag_bits & 0x1:
+                    files.append(SpooledFile(name, error="encrypted"))
+                    continue
+                try:
+                    with zf.open(info) as member:
+                        spool, fingerprint = _spool_stream(member, config)
+                except Exception as e:
+                    # Too large, an unsupported compression method (NotImplementedError),
+                    # a bad CRC or a corrupt stream (BadZipFile, zlib.error, EOFError,
+                    # ...): only this member fails.
+                    files.append(SpooledFile(name, error=str(e)))
+                    continue
+                files.append(SpooledFile(name, spool, fingerprint))
+    except BaseException:
+        for file in files:
+            file.close()
+        raise
+    return files
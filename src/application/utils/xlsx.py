@@ -0,0 +1,81 @@
+from typing import Iterator, List, Optional, Sequence
+
+import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
+
+
+MESSAGE_COLUMNS = {"SHR", "DEP", "ARR"}
+TARGET_SHEETS_2024 = ["Калининград", "Тюмень", "Красноярск", "Иркутск", "Якутск"]
+
+
+def _cell(value):
+    # Same normalisation pandas.read_excel applies to openpyxl cells.
+    if isinstance(value, str) and value in STR_NA_VALUES:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def _header(row: Sequence) -> List:
+    names, seen = [], {}
+    for i, value in enumerate(row):
+        name = f"Unnamed: {i}" if value is None or value == "" else _cell(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def is_target_sheet(filename: str, sheet: str) -> bool:
+    is_2024_special = filename == "2024.xlsx" and sheet in TARGET_SHEETS_2024
+    is_2025 = filename == "2025.xlsx"
+    return is_2024_special or is_2025
+
+def target_rows(workbook, filename: str) -> Optional[int]:
+    """Data rows in the target sheets as recorded in their dimensions; None when one has none."""
+    total = 0
+    for sheet in workbook.sheetnames:
+        if is_target_sheet(filename, sheet):
+            last = workbook[sheet].max_row
+            if not last:
+                return None
+            total += last - 1
+    return total
+
+def read_header(sheet) -> Optional[List]:
+    for row in sheet.iter_rows(max_row=1, values_only=True):
+        return _header(row)
+    return None
+
+def has_message_columns(header: Optional[List]) -> bool:
+    return bool(header) and not MESSAGE_COLUMNS.isdisjoint(header)
+
+def _iter_rows(sheet, width: int, min_row: int = 2, max_row: Optional[int] = None) -> Iterator[Optional[List]]:
+    for row in sheet.iter_rows(min_row=min_row, max_row=max_row, values_only=True):
+        values = [_cell(v) for v in row[:width]]
+        if all(v is None for v in values):
+            yield None
+        else:
+            yield values + [None] * (width - len(values))
+
+def iter_sheet_chunks(sheet, header: List, chunk_size: int, min_row: int = 2) -> Iterator[pd.DataFrame]:
+    """Stream data rows from `min_row` on as DataFrames of about `chunk_size` rows.
+
+    Blank rows are kept only when a non-blank row follows, as read_excel does.
+    """
+    width = len(header)
+    chunk, blank = [], 0
+    for values in _iter_rows(sheet, width, min_row):
+        if values is None:
+            blank += 1
+            continue
+        chunk.extend([[None] * width] * blank)
+        chunk.append(values)
+        blank = 0
+        if len(chunk) >= chunk_size:
+            yield pd.DataFrame(chunk, columns=header, dtype=object)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame(chunk, columns=header, dtype=object)
@@ -0,0 +1,175 @@
+"""Row loop vs column-wise extraction throughput.
+
+Run from `src/`: python -m benchmarks.extract --rows 50000
+"""
+import argparse
+import re
+import time as timer
+from datetime import date, time
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from application.utils.extract import FLIGHT_COLUMNS, carry_forward, extract_columns, extract_flights
+from application.utils.geo import GEO_COLUMNS
+from benchmarks.synthetic import rows_2024, rows_2025
+
+
+def _sanitize(val) -> Optional[str]:
+    if pd.isna(val):
+        return None
+    return str(val).strip().rstrip(")/")
+
+def _parse_date(d) -> Optional[date]:
+    if pd.isna(d):
+        return None
+    try:
+        return pd.to_datetime(str(d), format="%y%m%d").date()
+    except Exception:
+        return None
+
+def _parse_time(t) -> Optional[time]:
+    if pd.isna(t):
+        return None
+    s = str(t).zfill(4)
+    try:
+        return pd.to_datetime(s, format="%H%M").time()
+    except Exception:
+        return None
+
+
+def legacy_rows(df: pd.DataFrame, filename: str, region: str, is_2025: bool) -> List[Dict]:
+    """The `iterrows` loop and scalar converters `_process_xlsx` used before the column-wise engine."""
+    batch = []
+    sid = reg = dep = dest = dof = eet = zona = typ = None
+    dep_time = arr_time = None
+    shr_out = shr_in = dep_out = dep_in = arr_out = arr_in = None
+
+    for _, row in df.iterrows():
+        shr_text = row.get("SHR")
+        dep_text = row.get("DEP")
+        arr_text = row.get("ARR")
+
+        row_region = row.get("Центр ЕС ОрВД") if is_2025 else region
+
+        if pd.notna(shr_text):
+            m = re.search(r"([\s\S]*)\(([\s\S]*)\)", str(shr_text))
+            if m:
+                shr_out, shr_in = m.group(1), m.group(2)
+                if shr_in:
+                    sid_m = re.search(r"SID/(\S+)", shr_in)
+                    sid = sid_m.group(1) if sid_m else None
+                    reg_m = re.search(r"REG/(\S+)", shr_in)
+                    reg = reg_m.group(1) if reg_m else None
+                    dep_m = re.search(r"DEP/(\S+)", shr_in)
+                    dep = dep_m.group(1) if dep_m else None
+                    dest_m = re.search(r"DEST/(\S+)", shr_in)
+                    dest = dest_m.group(1) if dest_m else None
+                    dof_m = re.search(r"DOF/(\S+)", shr_in)
+                    dof = dof_m.group(1) if dof_m else None
+                    eet_m = re.search(r"EET/(\S+)", shr_in)
+                    eet = eet_m.group(1) if eet_m else None
+                    typ_m = re.search(r"TYP/(\S+)", shr_in)
+                    typ = typ_m.group(1) if typ_m else None
+                    zona_m = re.search(r"ZONA ([^\/]+)\/", shr_in)
+                    zona = zona_m.group(1) if zona_m else None
+
+        if pd.notna(dep_text):
+            dep_str = str(dep_text)
+            if is_2025:
+                m = re.search(r"-ATD\s*(\d{4})", dep_str)
+                dep_time = m.group(1) if m else None
+            else:
+                m = re.search(r"([\s\S]*)\(([\s\S]*)\)", dep_str)
+                if m:
+                    dep_out, dep_in = m.group(1), m.group(2)
+                    if dep_in:
+                        m2 = re.search(r"DEP-[\s\S]*-ZZZZ(\d{4})", dep_in)
+                        dep_time = m2.group(1) if m2 else None
+
+        if pd.notna(arr_text):
+            arr_str = str(arr_text)
+            if is_2025:
+                m = re.search(r"-ATA\s*(\d{4})", arr_str)
+                arr_time = m.group(1) if m else None
+            else:
+                m = re.search(r"([\s\S]*)\(([\s\S]*)\)", arr_str)
+                if m:
+                    arr_out, arr_in = m.group(1), m.group(2)
+                    if arr_in:
+                        m2 = re.search(r"ARR-[\s\S]*-[\s\S]*-ZZZZ(\d{4})", arr_in)
+                        arr_time = m2.group(1) if m2 else None
+
+        batch.append({
+            "shr_col": shr_text if pd.notna(shr_text) else None,
+            "dep_col": dep_text if pd.notna(dep_text) else None,
+            "arr_col": arr_text if pd.notna(arr_text) else None,
+            "f1": _sanitize(shr_out),
+            "f2": _sanitize(dep_out),
+            "f3": _sanitize(arr_out),
+            "sid": _sanitize(sid),
+            "reg": _sanitize(reg),
+            "dep": _sanitize(dep),
+            "dest": _sanitize(dest),
+            "eet": _sanitize(eet),
+            "zona": _sanitize(zona),
+            "typ": _sanitize(typ),
+            "dof": _parse_date(dof),
+            "dep_time": _parse_time(dep_time),
+            "arr_time": _parse_time(arr_time),
+            "region": _sanitize(row_region),
+            "file": filename,
+        })
+    return batch
+
+
+# Times are now joined to their plan by SID + DOF instead of carried over from
+# earlier rows, so they differ from the row loop by design; only a plan whose
+# own row has the DEP or ARR is compared, in `_time_mismatches`. The row loop
+# has no decoded coordinates to compare against.
+COMPARED = [c for c in FLIGHT_COLUMNS if c not in ("dep_time", "arr_time", "block_minutes", *GEO_COLUMNS)]
+
+
+def _time_mismatches(df: pd.DataFrame, expected: List[Dict], got: List[Dict]) -> int:
+    return sum(
+        1 for shr, dep, arr, a, b in zip(df["SHR"], df["DEP"], df["ARR"], expected, got)
+        if pd.notna(shr) and any(
+            pd.notna(message) and a[column] != b[column]
+            for message, column in ((dep, "dep_time"), (arr, "arr_time"))
+        )
+    )
+
+
+def _timed(fn: Callable[[], object]):
+    started = timer.perf_counter()
+    result = fn()
+    return result, timer.perf_counter() - started
+
+
+def run(rows: int, is_2025: bool):
+    df = rows_2025(rows) if is_2025 else rows_2024(rows)
+    filename = "2025.xlsx" if is_2025 else "2024.xlsx"
+
+    expected, legacy_s = _timed(lambda: legacy_rows(df, filename, "Тюмень", is_2025))
+    frame, vector_s = _timed(lambda: extract_flights(df, filename, region="Тюмень", is_2025=is_2025))
+    _, fields_s = _timed(lambda: carry_forward(extract_columns(df, is_2025)))
+
+    got = frame.to_dict("records")
+    mismatches = sum(
+        1 for a, b in zip(expected, got)
+        if any(a[c] != b[c] for c in COMPARED)
+    ) + _time_mismatches(df, expected, got)
+    print(
+        f"{filename}: {rows} rows | iterrows {rows / legacy_s:,.0f} rows/s | "
+        f"column-wise {rows / vector_s:,.0f} rows/s | x{legacy_s / vector_s:.1f} | "
+        f"field extraction alone {rows / fields_s:,.0f} rows/s | "
+        f"mismatched rows: {mismatches + abs(len(expected) - len(got))}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+    run(args.rows, is_2025=False)
+    run(args.rows, is_2025=True)
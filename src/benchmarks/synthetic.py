@@ -0,0 +1,117 @@
+"""Synthetic 2024- and 2025-layout flight messages and fixture files.
+
+Run from `src/`: python -m benchmarks.synthetic --year 2024 --rows 100000 --format xlsx --out /tmp
+writes /tmp/2024.xlsx, named as the parser expects.
+"""
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import pandas as pd
+from openpyxl import Workbook
+
+
+REGIONS_2024 = ["Калининград", "Тюмень", "Красноярск", "Иркутск", "Якутск"]
+REGIONS_2025 = ["Санкт-Петербургский", "Московский", "Новосибирский", "Екатеринбургский"]
+TYPES = ["BLA", "AER", "SHAR", "1BLA", "2BLA"]
+
+
+def _coord(rng: random.Random) -> str:
+    return f"{rng.randint(45, 70):02d}{rng.randint(0, 59):02d}N{rng.randint(20, 170):03d}{rng.randint(0, 59):02d}E"
+
+def _shr(rng: random.Random, sid: int, dof: str, hhmm: str) -> str:
+    point = _coord(rng)
+    return (
+        "ZCZC\n(SHR-ZZZZZ\n"
+        f"-ZZZZ{hhmm}\n"
+        "-M0000/M0005 /ZONA R0,5 " + point + "/\n"
+        f"-ZZZZ0{rng.randint(1, 9)}00\n"
+        f"-DEP/{point} DEST/{point} DOF/{dof} EET/UNKU0{rng.randint(0, 5)}00 "
+        f"OPR/ГУ МЧС РОССИИ REG/0{rng.randint(1000, 9999)}{rng.choice('ABCDEF')} "
+        f"STS/SAR TYP/{rng.choice(TYPES)} RMK/WR{rng.randint(100, 999)} SID/{sid})"
+    )
+
+def _shift(hhmm: str, minutes: int) -> str:
+    total = (int(hhmm[:2]) * 60 + int(hhmm[2:]) + minutes) % 1440
+    return f"{total // 60:02d}{total % 60:02d}"
+
+def rows_2024(count: int, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    rows: List[dict] = []
+    for i in range(count):
+        sid = 7770000000 + i
+        dof = f"24{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}"
+        hhmm = f"{rng.randint(0, 23):02d}{rng.randint(0, 59):02d}"
+        arrival = _shift(hhmm, rng.randint(10, 300))
+        rows.append({
+            "SHR": _shr(rng, sid, dof, hhmm) if rng.random() > 0.05 else None,
+            "DEP": f"(DEP-ZZZZZ-ZZZZ{hhmm}-ZZZZ-DEP/{_coord(rng)} DOF/{dof} SID/{sid})" if rng.random() > 0.2 else None,
+            "ARR": f"(ARR-ZZZZZ-ZZZZ{hhmm}-ZZZZ{arrival}-DEP/{_coord(rng)} DOF/{dof} SID/{sid})" if rng.random() > 0.2 else None,
+        })
+    return pd.DataFrame(rows)
+
+def _next_day(dof: str) -> str:
+    return (datetime.strptime(dof, "%y%m%d") + timedelta(days=1)).strftime("%y%m%d")
+
+def rows_2025(count: int, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    rows: List[dict] = []
+    for i in range(count):
+        sid = 7780000000 + i
+        dof = f"25{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}"
+        hhmm = f"{rng.randint(0, 23):02d}{rng.randint(0, 59):02d}"
+        region, shr = rng.choice(REGIONS_2025), _shr(rng, sid, dof, hhmm)
+        dep = f"-TITLE IDEP\n-SID {sid}\n-ADD {dof}\n-ATD {hhmm}" if rng.random() > 0.2 else None
+        arr = None
+        if rng.random() > 0.2:
+            arrival = _shift(hhmm, rng.randint(10, 300))
+            # -ADA is the date of the arrival, the day after the DOF for overnight flights.
+            ada = _next_day(dof) if arrival < hhmm else dof
+            arr = f"-TITLE IARR\n-SID {sid}\n-ADA {ada}\n-ATA {arrival}"
+        rows.append({"Центр ЕС ОрВД": region, "SHR": shr, "DEP": dep, "ARR": arr})
+    return pd.DataFrame(rows)
+
+def rows(year: int, count: int, seed: int = 0) -> pd.DataFrame:
+    return rows_2025(count, seed) if year == 2025 else rows_2024(count, seed)
+
+def sheets(year: int, count: int, seed: int = 0) -> Dict[str, pd.DataFrame]:
+    """Workbook sheets as the source files lay them out: 2024 rows spread over
+    the regional sheets the parser reads, 2025 rows on one sheet."""
+    if year == 2025:
+        return {"Лист1": rows_2025(count, seed)}
+    per_sheet, extra = divmod(count, len(REGIONS_2024))
+    return {
+        region: rows_2024(per_sheet + (i < extra), seed + i)
+        for i, region in enumerate(REGIONS_2024)
+    }
+
+def write_xlsx(path: str, year: int, count: int, seed: int = 0):
+    # A write-only workbook streams rows to disk instead of holding every cell.
+    workbook = Workbook(write_only=True)
+    for name, frame in sheets(year, count, seed).items():
+        sheet = workbook.create_sheet(name)
+        sheet.append(list(frame.columns))
+        for row in frame.itertuples(index=False):
+            sheet.append([None if pd.isna(v) else v for v in row])
+    workbook.save(path)
+
+def write_csv(path: str, year: int, count: int, seed: int = 0):
+    rows(year, count, seed).to_csv(path, index=False)
+
+def write_fixture(directory: str, year: int, count: int, fmt: str, seed: int = 0) -> str:
+    path = os.path.join(directory, f"{year}.{fmt}")
+    (write_xlsx if fmt == "xlsx" else write_csv)(path, year, count, seed)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--year", type=int, choices=[2024, 2025], default=2024)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--format", choices=["xlsx", "csv"], default="xlsx")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=".")
+    args = parser.parse_args()
+    print(write_fixture(args.out, args.year, args.rows, args.format, args.seed))
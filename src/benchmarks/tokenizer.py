@@ -0,0 +1,107 @@
+"""Single-pass field 18 tokenizer vs one re.search per key.
+
+Run from `src/`: python -m benchmarks.tokenizer --messages 50000
+"""
+import argparse
+import re
+import time
+
+import pandas as pd
+
+from application.utils.extract import SHR_FIELDS, tokenize_shr
+from application.utils.tokenizer import shr_fields, tokenize
+from benchmarks.synthetic import rows_2024
+
+_PER_KEY = [r"SID/(\S+)", r"REG/(\S+)", r"DEP/(\S+)", r"DEST/(\S+)",
+            r"DOF/(\S+)", r"EET/(\S+)", r"TYP/(\S+)", r"ZONA ([^\/]+)\/"]
+
+
+# Messages where a key sits inside another word or value; shr_fields must
+# agree with the per-key searches on them too.
+EDGE_CASES = [
+    "SHR-ZZZZZ -ADEP/UUEE DOF/240101 SID/1",
+    "SHR-ZZZZZ -DEP/5957N02905E RMK/ZONA R0,5 5957N02905E/ SID/2",
+    "SHR-ZZZZZ -REG/RA1/TYP/BLA DOF/240101",
+    "SHR-ZZZZZ -DEP/ DEP/UUEE DEST/ DOF/240101",
+    "SHR-ZZZZZ -ZONA /M0005 ZONA ZONA R1 5957N02905E/",
+]
+# tokenize() keeps whole values and every key.
+TOKENIZE_CASES = [
+    ("-DEP/UUEE DEST/UUWW OPR/ГУ МЧС РОССИИ STS/SAR SID/7",
+     {"DEP": "UUEE", "DEST": "UUWW", "OPR": "ГУ МЧС РОССИИ", "STS": "SAR", "SID": "7"}),
+    ("-M0000/M0005 /ZONA R0,5 5957N02905E/ -ADEP/UUEE RMK/WR1 WR2",
+     {"ZONA": "R0,5 5957N02905E", "ADEP": "UUEE", "RMK": "WR1 WR2"}),
+]
+
+
+def per_key_search(shr_in: str):
+    """The eight uncompiled searches the row parser used to run per SHR cell."""
+    found = []
+    for pattern in _PER_KEY:
+        m = re.search(pattern, shr_in)
+        found.append(m.group(1) if m else None)
+    return tuple(found)
+
+
+def _best_of(repeats: int, fn, messages):
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = [fn(m) for m in messages]
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def per_key_extract(shr_in: pd.Series) -> pd.DataFrame:
+    """One Series.str.extract per key, as the column-wise engine first did."""
+    return pd.DataFrame({field: shr_in.str.extract(p)[0] for field, p in zip(SHR_FIELDS, _PER_KEY)})
+
+
+def _column(count: int, repeats: int, distinct: float):
+    df = rows_2024(int(count * distinct)).dropna(subset=["SHR"])
+    df = df.sample(count, replace=True, random_state=0).reset_index(drop=True)
+    shr_in = df["SHR"].str.extract(r"([\s\S]*)\(([\s\S]*)\)")[1]
+
+    timings = []
+    for fn in (lambda: per_key_extract(shr_in), lambda: tokenize_shr(shr_in)):
+        best = None
+        for _ in range(repeats):
+            started = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append(best)
+    print(
+        f"column of {count} SHR cells drawn from {int(count * distinct)} messages | str.extract x8 {count / timings[0]:,.0f} rows/s | "
+        f"tokenize_shr {count / timings[1]:,.0f} rows/s"
+    )
+
+
+def main(count: int, repeats: int):
+    messages = [
+        re.search(r"([\s\S]*)\(([\s\S]*)\)", text).group(2)
+        for text in rows_2024(count)["SHR"].dropna()
+    ]
+
+    expected, search_s = _best_of(repeats, per_key_search, messages)
+    got, tokenizer_s = _best_of(repeats, shr_fields, messages)
+
+    mismatches = sum(a != b for a, b in zip(expected, got))
+    mismatches += sum(per_key_search(m) != shr_fields(m) for m in EDGE_CASES)
+    mismatches += sum(tokenize(m) != items for m, items in TOKENIZE_CASES)
+    print(
+        f"{len(messages)} messages | re.search x8 {len(messages) / search_s:,.0f} msg/s | "
+        f"tokenizer {len(messages) / tokenizer_s:,.0f} msg/s | x{search_s / tokenizer_s:.1f} | "
+        f"mismatches: {mismatches}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    main(args.messages, args.repeats)
+    for distinct in (1.0, 0.2):
+        _column(args.messages, args.repeats, distinct)
@@ -0,0 +1,89 @@
+"""Peak RSS of handing an upload to the parser: whole-body read vs spooling.
+
+Both modes receive the same multipart request body in 1 MiB messages.
+
+Run from `src/`: python -m benchmarks.upload --mb 256
+Each mode runs in a fresh interpreter so ru_maxrss is not shared between them.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from starlette.requests import Request
+
+from configuration.config import UploadConfig
+from application.utils.upload import spool_form
+
+
+BOUNDARY = "benchmark-boundary"
+CHUNK = 1024 * 1024
+
+
+def _rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _request(path: str) -> Request:
+    head = (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"2024.xlsx\"\r\n"
+            "Content-Type: application/octet-stream\r\n\r\n").encode()
+    tail = f"\r\n--{BOUNDARY}--\r\n".encode()
+    fh = open(path, "rb")
+    pending = [head]
+
+    async def receive():
+        chunk = pending.pop() if pending else fh.read(CHUNK)
+        if not chunk:
+            fh.close()
+            return {"type": "http.request", "body": tail, "more_body": False}
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+    return Request({"type": "http", "method": "POST", "headers": headers}, receive)
+
+
+async def _read_whole(request: Request):
+    form = await request.form()
+    await form["file"].read()
+    await form.close()
+
+
+async def _spool(request: Request):
+    config = UploadConfig(chunk_size=CHUNK, spool_max_memory=8 * 1024 * 1024, max_size=sys.maxsize, max_files=1,
+                          max_archive_size=sys.maxsize)
+    file, = await spool_form(request, "file", config)
+    with file.spool:
+        while file.spool.read(CHUNK):
+            pass
+
+
+def _measure(mode: str, path: str):
+    before = _rss_mb()
+    request = _request(path)
+    asyncio.run(_read_whole(request) if mode == "read" else _spool(request))
+    print(f"{mode:>6}: peak RSS {_rss_mb():8.1f} MB (+{_rss_mb() - before:.1f} MB)")
+
+
+def main(mb: int):
+    with tempfile.NamedTemporaryFile(delete=False) as payload:
+        for _ in range(mb):
+            payload.write(os.urandom(1024 * 1024))
+    try:
+        for mode in ("read", "spool"):
+            subprocess.run([sys.executable, "-m", "benchmarks.upload", "--measure", mode, payload.name], check=True)
+    finally:
+        os.unlink(payload.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=int, default=256)
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "PATH"))
+    args = parser.parse_args()
+    if args.measure:
+        _measure(*args.measure)
+    else:
+        main(args.mb)
@@ -10,6 +10,10 @@ class DataBaseConfig:
     database_host: str
     database_port: int
     database_name: str
+    pool_size: int
+    pool_max_overflow: int
+    pool_pre_ping: bool
+    partitioned: bool
 
 
 
@@ -17,6 +21,36 @@ class DataBaseConfig:
 class App:
     host: str
     port: int
+    workers: int
+    backlog: int
+    graceful_timeout: int
+
+
+@dataclass
+class IngestConfig:
+    batch_size: int
+    chunk_size: int
+    workers: int
+    queue_limit: int
+    jobs_retain: int
+    parse_processes: int
+    checkpoint_batches: int
+    progress_interval: float
+    stage_retain_hours: int
+
+
+@dataclass
+class UploadConfig:
+    chunk_size: int
+    spool_max_memory: int
+    max_size: int
+    max_files: int
+    max_archive_size: int
+
+
+@dataclass
+class ExportConfig:
+    parquet_dir: str
 
 
     
@@ -25,6 +59,9 @@ class App:
 class Config:
     db: DataBaseConfig
     app: App
+    ingest: IngestConfig
+    upload: UploadConfig
+    export: ExportConfig
     debug: bool
 
 
@@ -41,8 +78,39 @@ def load_config(path: str = None) -> Config:
             database_host=env("POSTGRES_HOST"),
             database_port=env("POSTGRES_PORT"),
             database_name=env("POSTGRES_DB"),
+            pool_size=env.int("POSTGRES_POOL_SIZE", default=5),
+            pool_max_overflow=env.int("POSTGRES_POOL_MAX_OVERFLOW", default=10),
+            pool_pre_ping=env.bool("POSTGRES_POOL_PRE_PING", default=True),
+            partitioned=env.bool("POSTGRES_PARTITIONED", default=False),
+        ),
+        app=App(
+            host=env("HOST"),
+            port=int(env("PORT")),
+            workers=env.int("APP_WORKERS", default=1),
+            backlog=env.int("APP_BACKLOG", default=2048),
+            graceful_timeout=env.int("APP_GRACEFUL_TIMEOUT", default=10),
+        ),
+        ingest=IngestConfig(
+            batch_size=env.int("INGEST_BATCH_SIZE", default=10000),
+            chunk_size=env.int("INGEST_CHUNK_SIZE", default=50000),
+            workers=env.int("INGEST_WORKERS", default=2),
+            queue_limit=env.int("INGEST_QUEUE_LIMIT", default=16),
+            jobs_retain=env.int("INGEST_JOBS_RETAIN", default=1000),
+            parse_processes=env.int("INGEST_PARSE_PROCESSES", default=1),
+            checkpoint_batches=env.int("INGEST_CHECKPOINT_BATCHES", default=10),
+            progress_interval=env.float("INGEST_PROGRESS_INTERVAL", default=1.0),
+            stage_retain_hours=env.int("INGEST_STAGE_RETAIN_HOURS", default=72),
+        ),
+        upload=UploadConfig(
+            chunk_size=env.int("UPLOAD_CHUNK_SIZE", default=1024 * 1024),
+            spool_max_memory=env.int("UPLOAD_SPOOL_MAX_MEMORY", default=8 * 1024 * 1024),
+            max_size=env.int("UPLOAD_MAX_SIZE", default=4 * 1024 ** 3),
+            max_files=env.int("UPLOAD_MAX_FILES", default=256),
+            max_archive_size=env.int("UPLOAD_MAX_ARCHIVE_SIZE", default=16 * 1024 ** 3),
+        ),
+        export=ExportConfig(
+            parquet_dir=env("EXPORT_PARQUET_DIR", default="/app/data/parquet"),
         ),
-        app=App(host=env("HOST"), port=int(env("PORT"))),
         
         
         debug=env.bool("DEBUG", default=False),
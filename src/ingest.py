@@ -0,0 +1,135 @@
+"""Bulk-ingest a directory of flight files with the service's parser.
+
+Run from `src/`: python ingest.py /data/archive --workers 4
+    --parquet DIR  write a Parquet dataset partitioned by region and DOF month
+                   under DIR instead of loading the database
+Files are parsed and loaded concurrently, one file per worker process, and each
+file is streamed to the database in batches. Files whose content was already
+ingested are skipped and interrupted files resume from their last checkpoint,
+so an interrupted backfill can simply be started again.
+"""
+import argparse
+import dataclasses
+import hashlib
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional
+
+from application.utils.db import create_db_engine, drop_stale_loads, init_schema
+from application.utils.export import export_file
+from application.utils.parser import parse_file
+from application.utils.progress import IngestProgress
+from configuration.config import Config, load_config
+
+
+PATTERNS = ["*.xlsx", "*.csv"]
+
+_config: Optional[Config] = None
+_engine = None
+_parquet_dir: Optional[str] = None
+
+
+@dataclasses.dataclass
+class FileResult:
+    path: str
+    rows: int
+    seconds: float
+    skipped: bool
+    error: Optional[str]
+
+
+def _fingerprint(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while chunk := fh.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _init_worker(config: Config, parquet_dir: Optional[str]):
+    global _config, _engine, _parquet_dir
+    # Files are the unit of parallelism here, so sheets are parsed in this
+    # process rather than on a parse pool of its own.
+    _config = config
+    _parquet_dir = parquet_dir
+    if parquet_dir is None:
+        _engine = create_db_engine(dataclasses.replace(config.db, pool_size=1, pool_max_overflow=0))
+
+def _ingest(path: str) -> FileResult:
+    started = time.perf_counter()
+    progress = IngestProgress()
+    file = Path(path)
+    with open(file, "rb") as source:
+        if _parquet_dir is not None:
+            error = export_file(_parquet_dir, file.name, source, _config.ingest, progress, _fingerprint(file))
+        else:
+            error = parse_file(_engine, file.name, source, _config.ingest, progress, _fingerprint(file))
+    return FileResult(path, progress.rows_written, time.perf_counter() - started, progress.skipped, error)
+
+def find_files(directory: Path, patterns: List[str], recursive: bool) -> List[Path]:
+    found = set()
+    for pattern in patterns:
+        found.update(directory.rglob(pattern) if recursive else directory.glob(pattern))
+    # Largest first, so a big file does not start last and hold up the end of the run.
+    return sorted(found, key=lambda p: p.stat().st_size, reverse=True)
+
+def run(config: Config, files: List[Path], workers: int, parquet_dir: Optional[str] = None) -> List[FileResult]:
+    if parquet_dir is None:
+        engine = create_db_engine(config.db)
+        init_schema(engine, config.db.partitioned)
+        drop_stale_loads(engine, config.ingest.stage_retain_hours)
+        engine.dispose()
+    results = []
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(config, parquet_dir)) as pool:
+        futures = {pool.submit(_ingest, str(path)): path for path in files}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = FileResult(str(futures[future]), 0, 0.0, False, f"Processing failed: {e}")
+            results.append(result)
+            status = "skipped" if result.skipped else (result.error or "ok")
+            print(f"{result.path}: {result.rows} rows in {result.seconds:.1f}s ({status})", flush=True)
+    return results
+
+def summarize(results: List[FileResult], elapsed: float):
+    rows = sum(r.rows for r in results)
+    loaded = [r for r in results if not r.error and not r.skipped]
+    skipped = [r for r in results if r.skipped]
+    failed = [r for r in results if r.error]
+    print(
+        f"{len(results)} files: {len(loaded)} loaded, {len(skipped)} skipped, {len(failed)} failed | "
+        f"{rows} rows in {elapsed:.1f}s | {rows / elapsed if elapsed else 0:,.0f} rows/s"
+    )
+    for r in failed:
+        print(f"  failed {r.path}: {r.error}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--pattern", action="append", help=f"glob of files to ingest (default: {' '.join(PATTERNS)})")
+    parser.add_argument("--recursive", action="store_true")
+    parser.add_argument("--env-file", default="/app/.env")
+    parser.add_argument("--parquet", metavar="DIR", help="export to a Parquet dataset instead of the database")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.env_file)
+    files = find_files(args.directory, args.pattern or PATTERNS, args.recursive)
+    if not files:
+        print(f"no files to ingest in {args.directory}")
+        return 0
+
+    started = time.perf_counter()
+    results = run(config, files, min(args.workers, len(files)), args.parquet)
+    summarize(results, time.perf_counter() - started)
+    return 1 if any(r.error for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,14 @@
-import uvicorn
-
-from application.app import create_app
-from configuration.config import get_settings
+import time
 
+# Cold start is measured from here, before the service's imports.
+STARTED_AT = time.monotonic()
 
+import logging
 
-config = get_settings()
+from application.server import serve
+from configuration.config import get_settings
 
 
 if __name__ == "__main__":
-    uvicorn.run(create_app(), host=config.app.host, port=config.app.port)
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    serve(get_settings(), STARTED_AT)
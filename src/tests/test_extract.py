@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+
+from application.utils.extract import extract_columns, extract_flights
+from benchmarks.extract import COMPARED, legacy_rows
+from benchmarks.synthetic import rows_2024, rows_2025
+
+
+@pytest.mark.parametrize("is_2025", [False, True])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_extract_flights_matches_legacy_loop(is_2025, seed):
+    df = rows_2025(1000, seed=seed) if is_2025 else rows_2024(1000, seed=seed)
+    filename = "2025.xlsx" if is_2025 else "2024.xlsx"
+
+    expected = legacy_rows(df, filename, "Тюмень", is_2025)
+    got = extract_flights(df, filename, region="Тюмень", is_2025=is_2025,
+                          columns=extract_columns(df, is_2025)).to_dict("records")
+
+    assert len(got) == len(expected)
+    for shr, dep, arr, a, b in zip(df["SHR"], df["DEP"], df["ARR"], expected, got):
+        assert {c: b[c] for c in COMPARED} == {c: a[c] for c in COMPARED}
+        # Times are joined to their plan by SID + DOF rather than carried over
+        # from earlier rows, so they only agree on a plan's own DEP or ARR row.
+        if pd.notna(shr):
+            for message, column in ((dep, "dep_time"), (arr, "arr_time")):
+                if pd.notna(message):
+                    assert b[column] == a[column]
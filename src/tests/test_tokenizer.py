@@ -0,0 +1,30 @@
+import re
+
+import pytest
+
+from application.utils.tokenizer import shr_fields, tokenize
+from benchmarks.synthetic import rows_2024
+from benchmarks.tokenizer import EDGE_CASES, TOKENIZE_CASES, per_key_search
+
+
+def _messages(count: int, seed: int):
+    return [
+        re.search(r"([\s\S]*)\(([\s\S]*)\)", text).group(2)
+        for text in rows_2024(count, seed=seed)["SHR"].dropna()
+    ]
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_shr_fields_matches_per_key_search(seed):
+    for message in _messages(500, seed):
+        assert shr_fields(message) == per_key_search(message), message
+
+
+@pytest.mark.parametrize("message", EDGE_CASES)
+def test_shr_fields_matches_per_key_search_on_edge_cases(message):
+    assert shr_fields(message) == per_key_search(message)
+
+
+@pytest.mark.parametrize("message, items", TOKENIZE_CASES)
+def test_tokenize(message, items):
+    assert tokenize(message) == items